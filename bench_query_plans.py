@@ -0,0 +1,67 @@
+"""
+Планы запросов (EXPLAIN QUERY PLAN) до и после миграции с индексами 5b2e8c4f1a3d.
+
+Таблицы создаются из моделей в SQLite в памяти, затем к ним применяется upgrade() миграции -
+рабочая taskmanager.db не затрагивается.
+
+Запуск:
+    python -m mtasks.bench_query_plans
+"""
+
+from pathlib import Path
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+
+from mtasks.backend.db import Base
+from mtasks.models import Task_sql, User_sql  # noqa: F401 - регистрация таблиц в Base.metadata
+
+REVISION = "5b2e8c4f1a3d"
+
+QUERIES = {
+    "user by username": "SELECT * FROM users WHERE username = 'oleg'",
+    "user by slug": "SELECT * FROM users WHERE slug = 'oleg'",
+    "task by slug": "SELECT * FROM tasks WHERE slug = 'task-1'",
+    "task by title": "SELECT * FROM tasks WHERE title = 'Task 1'",
+    "tasks of user, open, priority": (
+        "SELECT * FROM tasks WHERE user_id = 7 AND completed = 0 AND priority = 3"
+    ),
+    "open tasks of user by priority": (
+        "SELECT * FROM tasks WHERE user_id = 7 AND completed = 0 ORDER BY priority DESC"
+    ),
+}
+
+
+def query_plans(connection) -> dict[str, str]:
+    plans = {}
+    for name, sql in QUERIES.items():
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        plans[name] = "; ".join(row[-1] for row in rows)
+    return plans
+
+
+def apply_migration(connection, revision: str = REVISION):
+    script = ScriptDirectory(str(Path(__file__).parent / "alembic"))
+    module = script.get_revision(revision).module
+    with Operations.context(MigrationContext.configure(connection)):
+        module.upgrade()
+
+
+def main():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        before = query_plans(connection)
+        apply_migration(connection)
+        after = query_plans(connection)
+
+    for name in QUERIES:
+        print(name)
+        print(f"    до:    {before[name]}")
+        print(f"    после: {after[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Бенчмарк старта приложения:
+    1. Профиль импорта (python -X importtime) - какие модули дольше всего импортируются при import mtasks.main
+    2. Холодный старт воркера uvicorn до первого ответа 200 на GET /
+
+Запуск (из корня проекта, как и create_db):
+    python -m mtasks.bench_startup
+    python -m mtasks.bench_startup --target-ms 1500 --top 20
+
+Код возврата 1, если холодный старт дольше целевого значения - удобно для CI.
+"""
+
+import argparse
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+TARGET_MS = 1500  # Целевое время от запуска воркера до первого 200
+
+
+def import_profile(module: str = "mtasks.main", top: int = 15):
+    """Возвращает (общее время импорта в мс, top модулей по cumulative времени)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # Формат строки: "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    total_us = sum(self_us for _, self_us, _ in rows)
+    rows.sort(reverse=True)
+    return total_us / 1000, rows[:top]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cold_start(app: str = "mtasks.main:app", timeout: float = 30.0) -> float:
+    """Запускает uvicorn и возвращает время в мс до первого ответа 200 на GET /"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn завершился с кодом {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"Нет ответа 200 за {timeout} с")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль импорта и холодный старт приложения")
+    parser.add_argument("--target-ms", type=float, default=TARGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total_ms, rows = import_profile(top=args.top)
+    print(f"Импорт mtasks.main: {total_ms:.1f} ms")
+    print(f"{'cumulative, ms':>15} {'self, ms':>10}  модуль")
+    for cumulative_us, self_us, name in rows:
+        print(f"{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f}  {name}")
+
+    startup_ms = cold_start()
+    status = "OK" if startup_ms <= args.target_ms else "FAIL"
+    print(f"Холодный старт до первого 200: {startup_ms:.0f} ms (цель {args.target_ms:.0f} ms) - {status}")
+    sys.exit(0 if status == "OK" else 1)
+
+
+if __name__ == "__main__":
+    main()
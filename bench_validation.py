@@ -0,0 +1,119 @@
+"""
+Микробенчмарк стоимости валидации на один запрос PATCH пользователя:
+    1. Способы получить User из сохранённой записи - User(**u), TypeAdapter (новый на каждый вызов и закешированный),
+       model_validate(from_attributes=True) для записи-объекта (как строка SQLAlchemy), model_construct
+       и users._construct_user
+    2. Старый путь PATCH (model_dump + обновление словаря + User(**u)) против общего users._patch_user;
+       _patch_user делает больше - проверка If-Match под блокировкой и заголовок ETag (~1 мкс из его времени)
+    3. Полный запрос PATCH /user/two/{username} через TestClient - валидация тела, маршрут и сериализация ответа
+
+Запуск (из корня проекта, как и create_db):
+    python -m mtasks.bench_validation
+    python -m mtasks.bench_validation --number 50000 --target-us 20
+
+Код возврата 1, если _patch_user дольше целевого значения - удобно для CI.
+"""
+
+import argparse
+import sys
+import timeit
+from types import SimpleNamespace
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from mtasks.schemas import User, UpdateUser
+from mtasks.routers import users
+
+TARGET_US = 20  # Целевое время _patch_user на один вызов, мкс
+
+RECORD = {"user_id": 1, "username": "bench", "firstname": "Ivan", "lastname": "Petrov", "age": 30, "slug": "bench",
+          "version": 1}
+PATCH = UpdateUser(firstname="Petr", age=31)
+_USER = TypeAdapter(User)
+
+
+def _old_patch(username: str, user: UpdateUser) -> User:
+    """Как было до общего пути: model_dump, обновление словаря и повторная валидация всей записи"""
+    u = users._find_user(username)
+    users._update_user(u, user.model_dump(exclude_unset=True, exclude_none=True))
+    return User(**u)
+
+
+def measure(number: int) -> list[tuple[str, float]]:
+    """Возвращает (название, мкс на вызов) для каждого варианта"""
+    users._add_user(dict(RECORD))
+    row = SimpleNamespace(**RECORD)
+    # TypeAdapter на каждый вызов строит схему заново - на порядки медленнее, хватит меньшего числа повторов
+    rare = max(number // 100, 1)
+    cases = [
+        ("User(**u)", lambda: User(**RECORD), number),
+        ("TypeAdapter(User) на каждый вызов", lambda: TypeAdapter(User).validate_python(RECORD), rare),
+        ("закешированный TypeAdapter", lambda: _USER.validate_python(RECORD), number),
+        ("model_validate(from_attributes)", lambda: User.model_validate(row, from_attributes=True), number),
+        ("model_construct(**u)", lambda: User.model_construct(**RECORD), number),
+        ("users._construct_user(u)", lambda: users._construct_user(RECORD), number),
+        ("PATCH: model_dump + User(**u)", lambda: _old_patch(RECORD["username"], PATCH), number),
+        ("PATCH: _patch_user", lambda: users._patch_user(RECORD["username"], PATCH, Response()), number),
+    ]
+    try:
+        return [(name, timeit.timeit(fn, number=n) / n * 1e6) for name, fn, n in cases]
+    finally:
+        users._remove_user(users._find_user(RECORD["username"]))
+
+
+def measure_request(number: int) -> float:
+    """Мкс на полный запрос PATCH через TestClient (включает накладные расходы клиента)"""
+    from fastapi.testclient import TestClient
+    from starlette.middleware import Middleware
+    from mtasks.main import app
+    from mtasks.ratelimit import RateLimitMiddleware
+
+    # Все запросы идут от одного клиента - с обычными лимитами большая часть получила бы 429 и измерялись бы отказы.
+    # Middleware остаётся в цепочке (его стоимость - часть запроса), но с лимитами, которых бенчмарк не достигнет
+    saved = app.user_middleware
+    app.user_middleware = [
+        Middleware(RateLimitMiddleware, client_rate=1e9, client_burst=10 ** 9, route_limits={})
+        if m.cls is RateLimitMiddleware else m
+        for m in saved
+    ]
+    app.middleware_stack = None     # Цепочка middleware собирается заново при старте клиента
+
+    def patch():
+        response = client.patch(f"/user/two/{RECORD['username']}", json=body)
+        assert response.status_code == 200, response.status_code
+
+    try:
+        with TestClient(app) as client:
+            client.post("/user/create", json={k: v for k, v in RECORD.items() if k not in ("user_id", "version")})
+            body = PATCH.model_dump(exclude_unset=True)
+            seconds = timeit.timeit(patch, number=number)
+            client.delete("/user/delete", params={"username": RECORD["username"]})
+    finally:
+        app.user_middleware = saved
+        app.middleware_stack = None
+    return seconds / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость валидации на запрос PATCH пользователя")
+    parser.add_argument("--number", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=500, help="Число полных запросов, 0 - пропустить")
+    parser.add_argument("--target-us", type=float, default=TARGET_US)
+    args = parser.parse_args()
+
+    results = measure(args.number)
+    print(f"{'мкс/вызов':>10}  вариант")
+    for name, us in results:
+        print(f"{us:>10.2f}  {name}")
+    if args.requests:
+        print(f"{measure_request(args.requests):>10.2f}  полный запрос PATCH /user/two/{{username}}")
+
+    patch_us = dict(results)["PATCH: _patch_user"]
+    status = "OK" if patch_us <= args.target_us else "FAIL"
+    print(f"_patch_user: {patch_us:.2f} мкс (цель {args.target_us:.0f} мкс) - {status}")
+    sys.exit(0 if status == "OK" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Журнал изменений (change feed) с монотонно растущей версией.
+
+Каждое изменение (insert / update / delete) получает следующий номер версии и попадает в ограниченный журнал
+(deque на MAX_CHANGES записей). Клиент запоминает последнюю версию и запрашивает только то, что изменилось после неё:
+стоимость опроса - O(изменений), а не O(всей таблицы).
+
+Если клиент отстал сильнее, чем хранит журнал, since() возвращает None - клиенту нужна полная синхронизация.
+То же для версии новее текущей: журнал живёт в памяти и после перезапуска начинается с нуля, а пустой список
+означал бы для клиента "ничего не изменилось".
+"""
+
+from collections import deque
+
+MAX_CHANGES = 10_000
+
+
+class ChangeLog:
+    def __init__(self, max_changes: int = MAX_CHANGES):
+        self.version = 0
+        self._log: deque[tuple[int, str, int, dict | None]] = deque(maxlen=max_changes)
+
+    def record(self, op: str, key: int, item: dict | None = None) -> int:
+        """op - insert / update / delete; item - снимок записи после изменения (для delete - None)"""
+        self.version += 1
+        self._log.append((self.version, op, key, item))
+        return self.version
+
+    @property
+    def oldest(self) -> int:
+        """Наименьшая версия, начиная с которой журнал полон (since >= oldest)"""
+        return self._log[0][0] - 1 if self._log else self.version
+
+    def since(self, version: int) -> list[tuple[int, str, int, dict | None]] | None:
+        """Изменения после version, по одному последнему на каждую запись; None - журнал не покрывает version"""
+        if version < self.oldest or version > self.version:
+            return None
+        latest = {}
+        # Идём с конца: новые изменения в правой части журнала, останавливаемся на version
+        for entry in reversed(self._log):
+            if entry[0] <= version:
+                break
+            latest.setdefault(entry[2], entry)
+        return sorted(latest.values())
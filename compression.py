@@ -0,0 +1,221 @@
+"""
+Сжатие ответов (gzip, а также br и zstd, если установлены пакеты brotli / zstandard).
+
+Ответы меньше minimum_size не сжимаются - для маленьких JSON заголовки и CPU дороже выигрыша.
+Готовые (не потоковые) тела от OFFLOAD_SIZE (большие страницы GET /task/, результат экспорта /jobs/{id}/result)
+хэшируются и сжимаются в пуле потоков, чтобы цикл событий тем временем обслуживал другие запросы, а сжатый вариант
+кэшируется по хэшу тела: одно и то же тело сжимается один раз, а не на каждый запрос. Меньшие тела сжимаются сразу,
+без кэша: для них хэш тела стоит почти столько же, сколько само сжатие.
+Потоковые ответы (StreamingResponse) сжимаются по частям, без кэша; части от OFFLOAD_SIZE - тоже в пуле потоков.
+"""
+
+import gzip
+import hashlib
+import zlib
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:     # Необязательная зависимость
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/x-ndjson")
+# Server-Sent Events не сжимаем: сжатие буферизует поток, и события доходили бы до клиента с задержкой
+SKIP_TYPES = ("text/event-stream",)
+OFFLOAD_SIZE = 256 * 1024   # С какого размера сжатие уходит из цикла событий в пул потоков, а результат - в кэш
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+
+class _StreamCompressor:
+    """Сжатие потока по частям: compress(chunk) / flush()"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=5)
+            self.compress, self._finish = self._obj.process, self._obj.finish
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+            self.compress, self._finish = self._obj.compress, self._obj.flush
+        else:
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 - формат gzip
+            self.compress, self._finish = self._obj.compress, self._obj.flush
+
+    def flush(self) -> bytes:
+        return self._finish()
+
+
+class CompressedCache:
+    """
+    LRU-кэш сжатых тел: (хэш тела, кодировка) -> сжатые байты. Сумма сжатых тел - не больше max_bytes
+    (32 МБ по умолчанию), сверх этого вытесняются самые давние; несжатые тела кэш не держит. Сверх max_bytes на
+    запись приходится только ключ (16 байт хэша) и узел OrderedDict, а записей немного - в кэш попадают только
+    тела от OFFLOAD_SIZE
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+
+    @staticmethod
+    def key(body: bytes, encoding: str) -> tuple[bytes, str]:
+        return hashlib.blake2b(body, digest_size=16).digest(), encoding
+
+    def get(self, key: tuple[bytes, str]) -> bytes | None:
+        compressed = self._items.get(key)
+        if compressed is not None:
+            self._items.move_to_end(key)
+        return compressed
+
+    def put(self, key: tuple[bytes, str], compressed: bytes):
+        if key in self._items:
+            return
+        self._items[key] = compressed
+        self.size += len(compressed)
+        while self.size > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    async def get_or_compress_async(self, body: bytes, encoding: str) -> bytes:
+        """
+        Тела меньше OFFLOAD_SIZE сжимаются сразу и не кэшируются. Для больших хэш и сжатие - в пуле потоков,
+        сам кэш меняется только в цикле событий
+        """
+        if len(body) < OFFLOAD_SIZE:
+            return _compress(body, encoding)
+        key = await run_in_threadpool(self.key, body, encoding)
+        compressed = self.get(key)
+        if compressed is None:
+            compressed = await run_in_threadpool(_compress, body, encoding)
+            self.put(key, compressed)
+        return compressed
+
+
+def _header(headers: list[tuple[bytes, bytes]], name: bytes) -> bytes | None:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _with_vary(headers: list[tuple[bytes, bytes]]) -> list[tuple[bytes, bytes]]:
+    """Добавляет Accept-Encoding к существующему Vary (или новый заголовок), не затирая другие значения"""
+    result = []
+    found = False
+    for key, value in headers:
+        if key.lower() == b"vary":
+            found = True
+            tokens = [t.strip().lower() for t in value.split(b",")]
+            if b"accept-encoding" not in tokens and b"*" not in tokens:
+                value += b", Accept-Encoding"
+        result.append((key, value))
+    if not found:
+        result.append((b"vary", b"Accept-Encoding"))
+    return result
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Лучшая кодировка из Accept-Encoding, которую умеет сервер (q=0 - запрет)"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    for encoding, available in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)):
+        if available is not None and offered.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI-middleware сжатия ответов: app.add_middleware(CompressionMiddleware, minimum_size=1000)"""
+
+    def __init__(self, app, minimum_size: int = 1000, cache_max_bytes: int = 32 * 1024 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = CompressedCache(cache_max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None   # Не None - сжимаем поток по частям
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message     # Заголовки отправим, когда станет понятно, сжимать ли тело
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                # Список, а не dict: повторяющиеся заголовки (несколько Set-Cookie) должны дойти все
+                response_headers = list(start["headers"])
+                content_type = (_header(response_headers, b"content-type") or b"").decode("latin-1")
+                if (
+                    _header(response_headers, b"content-encoding") is not None
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith(SKIP_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    await send(start)
+                    await send(message)
+                    return
+                response_headers = [(k, v) for k, v in response_headers if k.lower() != b"content-length"]
+                if more_body:
+                    compressor = _StreamCompressor(encoding)
+                    body = await self._compress_chunk(compressor, body)
+                else:
+                    body = await self.cache.get_or_compress_async(body, encoding)
+                    response_headers.append((b"content-length", str(len(body)).encode()))
+                response_headers.append((b"content-encoding", encoding.encode()))
+                await send({**start, "headers": _with_vary(response_headers)})
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            if compressor is None:
+                await send(message)
+                return
+            body = await self._compress_chunk(compressor, message.get("body", b""))
+            if not message.get("more_body", False):
+                body += compressor.flush()
+            await send({"type": "http.response.body", "body": body, "more_body": message.get("more_body", False)})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    async def _compress_chunk(compressor: _StreamCompressor, chunk: bytes) -> bytes:
+        if len(chunk) < OFFLOAD_SIZE:
+            return compressor.compress(chunk)
+        return await run_in_threadpool(compressor.compress, chunk)
@@ -1,5 +1,9 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 
 # Импорт моделей (чтобы они зарегистрировались в Base.metadata)
 # from mtasks.models import User_sql, Task_sql  # Абсолютный импорт (т.к. models/ — другой пакет) - вернул в create_db
@@ -20,14 +24,154 @@ DATABASE_URL = "sqlite:///mtasks/backend/taskmanager.db"    # Правильны
 # sqlite:///.taskmanager.db	                Точка в начале означает текущую директорию (аналог первго варианта)	Альтернатива sqlite:///taskmanager.db.
 
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    echo=True
-)
-# echo=True выводит SQL-запросы в консоль
+# Два engine для SQLite в режиме WAL: читатели не ждут писателя и друг друга, а писатель в SQLite всегда один.
+# Писатель - пул из одного соединения: записи выстраиваются в очередь пула, а не получают "database is locked".
+# Читатели - файл открыт только для чтения (mode=ro и PRAGMA query_only), соединений столько, сколько ядер.
+# Маршрут, который пишет, берёт get_db - вся его транзакция идёт через писателя; только читающий - get_read_db.
+READ_POOL_SIZE = os.cpu_count() or 4
+WRITE_POOL_TIMEOUT = 30     # Секунд ожидания соединения писателя, пока пишет другой запрос
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_engine = None  # Engine создаётся лениво - при первом обращении, а не при импорте модуля
+_read_engine = None
+
+
+def _in_memory(url) -> bool:
+    return url.database in (None, "", ":memory:")
+
+
+def get_engine():
+    """Возвращает engine писателя (его же используют create_db.py и alembic), создавая его при первом вызове"""
+    global _engine
+    if _engine is None:
+        if _in_memory(make_url(DATABASE_URL)):
+            # sqlite:// (тесты) - у SingletonThreadPool нет pool_size; одно общее соединение, иначе у каждого
+            # потока была бы своя пустая БД
+            pool_args = {"poolclass": StaticPool}
+        else:
+            # Одно соединение (QueuePool): записи идут по очереди
+            pool_args = {"pool_size": 1, "max_overflow": 0, "pool_timeout": WRITE_POOL_TIMEOUT}
+        _engine = create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            echo=True,
+            **pool_args,
+        )
+        # echo=True выводит SQL-запросы в консоль
+        event.listen(_engine, "connect", _on_write_connect)
+    return _engine
+
+
+def _on_write_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")   # Сохраняется в файле БД - читатели тоже работают в WAL
+    cursor.execute("PRAGMA busy_timeout=5000")  # Запись из другого процесса (alembic, seed) - подождать, а не ошибка
+    cursor.close()
+
+
+def _on_read_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def get_read_engine():
+    """Engine читателей; для БД в памяти (sqlite://) отдельного файла нет - тогда это engine писателя"""
+    global _read_engine
+    if _read_engine is None:
+        url = make_url(DATABASE_URL)
+        if _in_memory(url):
+            return get_engine()
+        # sqlite:///file:путь?mode=ro&uri=true - файл открывается в режиме URI только для чтения
+        url = url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"})
+        _read_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            echo=True,
+            pool_size=READ_POOL_SIZE,
+            max_overflow=0,
+        )
+        event.listen(_read_engine, "connect", _on_read_connect)
+    return _read_engine
+
+
+class RoutingSession(Session):
+    """
+    SELECT - через engine читателей, INSERT / UPDATE / DELETE и flush - через писателя. После первой записи
+    сессия до конца транзакции читает тоже через писателя: читатель не видит ещё не зафиксированные изменения.
+
+    SELECT до первой записи идут через читателя - это другой снимок БД, чем у записи после него. Код "прочитал,
+    проверил, записал" в такой сессии обязан проверять условие в самой записи (UPDATE ... WHERE version = ?);
+    get_db такого разрыва не имеет.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("writer") or self._flushing or clause is None or not clause.is_select:
+            self.info["writer"] = True
+            return get_engine()
+        return get_read_engine()
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_writer(session, transaction):
+    if transaction.parent is None:      # Закончилась внешняя транзакция, а не SAVEPOINT
+        session.info.pop("writer", None)
+
+
+def get_db():
+    """Зависимость FastAPI: одна сессия и одна транзакция на запрос
+
+    WriteSessionLocal.begin() делает commit при выходе из запроса и rollback, если маршрут упал с исключением,
+    поэтому внутри маршрута не нужно вызывать session.commit() после каждого изменения.
+    Вся транзакция - чтения тоже - идёт через соединение писателя: проверка и запись видят один снимок БД.
+    Маршрутам, которые только читают, - get_read_db.
+
+        @router.get("/")
+        def all_tasks(db: Session = Depends(get_db)):
+            ...
+    """
+    with WriteSessionLocal.begin() as session:
+        yield session
+
+
+def get_read_db():
+    """Зависимость FastAPI для маршрутов, которые только читают: соединение писателя не занимается никогда"""
+    with ReadSessionLocal() as session:
+        yield session
+
+
+def dispose_engine():
+    """Закрывает соединения обоих пулов (вызывается при остановке приложения)"""
+    global _engine, _read_engine
+    for engine in (_read_engine, _engine):
+        if engine is not None:
+            engine.dispose()
+    _engine = _read_engine = None
+
+
+def __getattr__(name):
+    # from mtasks.backend.db import engine - продолжает работать (create_db.py, env.py),
+    # но engine создаётся только в момент этого импорта (PEP 562)
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Engine выбирается в RoutingSession.get_bind при каждом запросе - и создаётся при первом из них
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+
+class ReadSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return get_read_engine()
+
+
+class WriteSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return get_engine()
+
+
+ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False)
+WriteSessionLocal = sessionmaker(class_=WriteSession, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
@@ -54,6 +54,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,   # SQLite не умеет ALTER COLUMN - autogenerate пишет op.batch_alter_table
     )
 
     with context.begin_transaction():
@@ -75,7 +76,12 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=True,
+            # Каждая миграция - своя транзакция, а не одна блокировка БД на весь upgrade.
+            # Для больших таблиц - mtasks.backend.migration_utils (backfill/copy_rows по частям)
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
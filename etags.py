@@ -0,0 +1,34 @@
+"""
+Оптимистическая блокировка по версии записи: ETag в ответе и If-Match в запросе.
+
+У каждой задачи и пользователя есть поле version, которое растёт при каждом изменении. Клиент получает его в теле
+ответа или в заголовке ETag ("3") и присылает обратно в If-Match при PUT / PATCH. Если запись за это время изменил
+кто-то другой, версия не совпадёт - ответ 412 Precondition Failed с текущим ETag, и изменения не применяются.
+Без If-Match запись обновляется как раньше - без проверки.
+
+Проверка и изменение выполняются без await между ними (или под блокировкой в синхронных маршрутах) - это
+compare-and-set: ни блокировок на время редактирования, ни лишнего GET перед записью.
+"""
+
+from fastapi import Header, HTTPException, Response
+
+IF_MATCH_HEADER = Header(None, description='Версия из ETag, например "3"; не совпадёт - 412, изменения не применяются')
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def check(if_match: str | None, version: int):
+    """412, если If-Match передан и ни одно значение из него не совпадает с текущей версией"""
+    if if_match is None or if_match.strip() == "*":
+        return
+    # Слабые метки W/"3" сравниваются по значению - версия одна и та же
+    tags = {tag.strip().removeprefix("W/") for tag in if_match.split(",")}
+    if etag(version) not in tags:
+        raise HTTPException(status_code=412, detail="Запись изменена другим запросом",
+                            headers={"ETag": etag(version)})
+
+
+def tag(response: Response, version: int):
+    response.headers["ETag"] = etag(version)
@@ -0,0 +1,93 @@
+"""
+Ключи идемпотентности (заголовок Idempotency-Key) для POST /task/create и POST /user/create.
+
+Клиент, не дождавшийся ответа из-за таймаута, повторяет запрос с тем же ключом. Без ключа повтор получает
+400 "already exists" и запускает дорогую сверку. С ключом первый ответ (и успешный, и ошибка) сохраняется,
+а повтор получает его копию с заголовком Idempotent-Replayed: true - обработчик и проверки уникальности
+не выполняются второй раз.
+
+Хранилище - LRU с TTL в памяти воркера (OrderedDict): не больше MAX_KEYS ключей, каждый живёт TTL секунд.
+Повтор с тем же ключом, но другим телом - 422; пока первый запрос ещё выполняется - 409.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+TTL = 24 * 60 * 60      # Секунд хранения ответа
+MAX_KEYS = 100_000
+_IN_PROGRESS = object()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = TTL, max_keys: int = MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._items: OrderedDict[tuple[str, str], tuple[float, bytes, object]] = OrderedDict()
+        self._lock = threading.Lock()   # create_user - синхронный маршрут и выполняется в пуле потоков
+
+    def begin(self, key: tuple[str, str], fingerprint: bytes):
+        """Сохранённый ответ (status, body) или None - тогда ключ помечается как выполняющийся"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] < now:
+                del self._items[key]
+                item = None
+            if item is None:
+                self._items[key] = (now + self.ttl, fingerprint, _IN_PROGRESS)
+                while len(self._items) > self.max_keys:
+                    self._items.popitem(last=False)
+                return None
+            self._items.move_to_end(key)
+        expires, stored_fingerprint, response = item
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key уже использован с другим телом запроса")
+        if response is _IN_PROGRESS:
+            raise HTTPException(status_code=409, detail="Запрос с этим Idempotency-Key ещё выполняется",
+                                headers={"Retry-After": "1"})
+        return response
+
+    def finish(self, key: tuple[str, str], fingerprint: bytes, status: int, body: bytes):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, fingerprint, (status, body))
+
+    def cancel(self, key: tuple[str, str]):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+store = IdempotencyStore()
+
+
+def run(scope: str, key: str | None, payload: BaseModel, handler: Callable[[], BaseModel]):
+    """Выполняет handler() один раз на ключ; повтор с тем же ключом получает сохранённый ответ"""
+    if not key:
+        return handler()
+    store_key = (scope, key)
+    fingerprint = hashlib.blake2b(payload.model_dump_json().encode(), digest_size=16).digest()
+    saved = store.begin(store_key, fingerprint)
+    if saved is not None:
+        status, body = saved
+        return Response(body, status_code=status, media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+    try:
+        result = handler()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            store.cancel(store_key)     # Ошибки сервера не запоминаем - повтор может пройти
+            raise
+        body = json.dumps({"detail": e.detail}, ensure_ascii=False).encode()
+        store.finish(store_key, fingerprint, e.status_code, body)
+        raise
+    except Exception:
+        store.cancel(store_key)
+        raise
+    store.finish(store_key, fingerprint, 200, result.model_dump_json().encode())
+    return result
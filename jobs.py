@@ -0,0 +1,205 @@
+"""
+Фоновые задания (jobs) для долгих операций: импорт и экспорт задач и пользователей.
+
+Маршрут ставит задание в очередь и сразу отвечает 202 с id задания, а не держит воркер до конца операции.
+Статус и прогресс - GET /jobs/{id}, результат - GET /jobs/{id}/result.
+
+Очередь ограничена (MAX_QUEUED): если она заполнена, новое задание не принимается - 503 с Retry-After,
+клиент повторит позже (backpressure), а память и очередь не растут без предела.
+Задания выполняют WORKERS корутин-воркеров в цикле событий приложения. Тяжёлую по CPU работу (сериализация)
+задание отдаёт в поток через asyncio.to_thread, чтобы не блокировать остальные запросы.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from fastapi import APIRouter, HTTPException, Response
+
+from mtasks.schemas import JobInfo
+
+WORKERS = 2             # Сколько заданий выполняется одновременно
+MAX_QUEUED = 100        # Сколько заданий может ждать в очереди
+MAX_KEPT = 1000         # Сколько завершённых заданий хранить для /jobs/{id}
+# Результаты (экспорт - JSON всей таблицы) занимают память, поэтому ограничены отдельно от числа заданий:
+# сверх MAX_RESULT_BYTES или старше RESULT_TTL результат удаляется, а /jobs/{id}/result отвечает 410
+MAX_RESULT_BYTES = 256 * 1024 * 1024
+RESULT_TTL = 600        # Секунд
+RETRY_AFTER = 5         # Секунд - подсказка клиенту при заполненной очереди
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+)
+
+
+@dataclass
+class Job:
+    kind: str
+    run: Callable[["Job"], Awaitable[Any]]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"      # queued -> running -> done / failed
+    total: int = 0
+    done: int = 0
+    result: Any = None
+    media_type: str = "application/json"
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    result_size: int = 0
+    expired: bool = False       # Результат удалён (MAX_RESULT_BYTES / RESULT_TTL), статус остаётся
+
+    def advance(self, n: int):
+        self.done += n
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            job_id=self.id,
+            kind=self.kind,
+            status=self.status,
+            total=self.total,
+            done=self.done,
+            progress=self.done / self.total if self.total else (1.0 if self.status == "done" else 0.0),
+            error=self.error,
+            status_url=f"/jobs/{self.id}",
+            result_url=f"/jobs/{self.id}/result" if self.status == "done" and not self.expired else None,
+        )
+
+
+class JobQueue:
+    def __init__(self, workers: int = WORKERS, max_queued: int = MAX_QUEUED, max_kept: int = MAX_KEPT,
+                 max_result_bytes: int = MAX_RESULT_BYTES, result_ttl: float = RESULT_TTL):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_kept = max_kept
+        self.max_result_bytes = max_result_bytes
+        self.result_ttl = result_ttl
+        self.result_bytes = 0   # Сумма result_size хранимых результатов
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, run: Callable[[Job], Awaitable[Any]], total: int = 0) -> Job:
+        """Ставит задание в очередь; очередь заполнена - HTTPException 503 с Retry-After"""
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="Job queue is not running")
+        job = Job(kind=kind, run=run, total=total)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503, detail="Job queue is full", headers={"Retry-After": str(RETRY_AFTER)}
+            ) from None
+        self.jobs[job.id] = job
+        self._evict()
+        return job
+
+    def _evict(self):
+        # Удаляем самые старые завершённые задания сверх MAX_KEPT (ожидающие и выполняющиеся не трогаем)
+        while len(self.jobs) > self.max_kept:
+            oldest = next((j for j in self.jobs.values() if j.finished_at is not None), None)
+            if oldest is None:
+                break
+            self._drop_result(oldest)
+            del self.jobs[oldest.id]
+
+    def _drop_result(self, job: Job):
+        self.result_bytes -= job.result_size
+        job.result = None
+        job.result_size = 0
+        job.expired = job.status == "done"
+
+    def expire_results(self):
+        """Удаляет результаты старше result_ttl, затем самые старые - пока сумма больше max_result_bytes"""
+        deadline = time.time() - self.result_ttl
+        for job in self.jobs.values():     # По порядку постановки - от старых к новым
+            if job.result_size and (job.finished_at < deadline or self.result_bytes > self.max_result_bytes):
+                self._drop_result(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                job.result = await job.run(job)
+                job.status = "done"
+                job.result_size = len(job.result) if isinstance(job.result, bytes) else 0
+                self.result_bytes += job.result_size
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e.detail) if isinstance(e, HTTPException) else repr(e)
+            finally:
+                job.finished_at = time.time()
+                self.expire_results()
+                self._queue.task_done()
+
+
+queue = JobQueue()
+
+
+def submit(kind: str, run: Callable[[Job], Awaitable[Any]], total: int = 0) -> Response:
+    """Ставит задание и возвращает ответ 202 с его статусом (для маршрутов импорта/экспорта)"""
+    job = queue.submit(kind, run, total)
+    return Response(
+        job.info().model_dump_json(),
+        status_code=202,
+        media_type="application/json",
+        headers={"Location": f"/jobs/{job.id}"},
+    )
+
+
+async def dump_json_chunks(adapter, items: list, job: Job, chunk_size: int = 10_000,
+                           copy: Callable[[Any], Any] | None = None) -> bytes:
+    """
+    Сериализует список в JSON частями в отдельном потоке, обновляя прогресс задания.
+    copy - снимок элемента, если элементы меняются на месте: делается в цикле событий, по порции перед её
+    сериализацией, так что цикл не блокируется копированием всего списка сразу
+    """
+    parts = []
+    for i in range(0, len(items), chunk_size):
+        chunk = items[i:i + chunk_size]
+        if copy is not None:
+            chunk = [copy(item) for item in chunk]
+        parts.append((await asyncio.to_thread(adapter.dump_json, chunk))[1:-1])    # без [ ]
+        job.advance(len(chunk))
+    return b"[" + b",".join(p for p in parts if p) + b"]"
+
+
+def _get_job(job_id: str) -> Job:
+    queue.expire_results()
+    job = queue.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}", response_model=JobInfo)
+async def job_status(job_id: str):
+    return _get_job(job_id).info()
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    job = _get_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}", headers={"Retry-After": "1"})
+    if job.expired:
+        raise HTTPException(status_code=410, detail="Job result expired")
+    if isinstance(job.result, bytes):
+        return Response(job.result, media_type=job.media_type)
+    return job.result
@@ -1,13 +1,42 @@
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from mtasks.backend.db import engine, Base
-from mtasks.routers import tasks, users
+from mtasks.backend import writes
+from mtasks import serialization
+from mtasks.compression import CompressionMiddleware
+from mtasks.ratelimit import RateLimitMiddleware
+from mtasks.routers import jobs, tasks, users
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка приложения"""
+    # SQLAlchemy и engine не импортируются при старте воркера: engine создаётся при первом обращении к БД
+    # (mtasks.backend.db.get_engine), поэтому воркер поднимается быстрее
+    await writes.start()
+    await jobs.queue.start()
+    await tasks.start_compactor()     # Окончательно убирает мягко удалённые задачи (tasks.SOFT_DELETE)
+    yield
+    await tasks.stop_compactor()
+    await jobs.queue.stop()
+    serialization.shutdown()
+    await writes.stop()
+    db = sys.modules.get("mtasks.backend.db")
+    if db is not None:  # Модуль БД мог так и не понадобиться
+        db.dispose_engine()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware, minimum_size=1000)   # Ответы от 1 КБ сжимаются (gzip/br/zstd)
+# Добавленный последним middleware выполняется первым: лишние запросы отсекаются до всей остальной работы
+app.add_middleware(RateLimitMiddleware)
 
 # Подключаем маршруты
 
 app.include_router(tasks.router)
 app.include_router(users.router)
+app.include_router(jobs.router)
 
 
 @app.get("/")
@@ -0,0 +1,151 @@
+"""
+Помощники для миграций больших таблиц: обновление (backfill) и копирование строк частями.
+
+op.batch_alter_table на SQLite копирует всю таблицу одной транзакцией - на миллионах строк это блокирует БД
+на минуты. Здесь каждая порция (batch_size строк по первичному ключу) - отдельная короткая транзакция,
+прогресс пишется в лог alembic и в таблицу _migration_progress, поэтому прерванную миграцию можно
+перезапустить (alembic upgrade head) - она продолжит с последней зафиксированной порции.
+
+Важно: run_in_chunks (и backfill / copy_rows) через autocommit_block фиксирует всё, что ревизия успела сделать
+до него, а номер ревизии в alembic_version записывается только в конце. После прерывания alembic выполнит ревизию
+заново - и DDL перед порциями тоже. Поэтому порции - в отдельной ревизии, а DDL - в предыдущей:
+
+    # ревизия A
+    def upgrade():
+        op.add_column("tasks", sa.Column("version", sa.Integer(), nullable=True))
+
+    # ревизия B (down_revision = A)
+    from mtasks.backend.migration_utils import backfill
+
+    def upgrade():
+        backfill("tasks_version", "tasks", "version = 1", where="version IS NULL", key="task_id")
+
+Если всё же в одной ревизии - DDL должен выдерживать повтор: add_column_if_missing вместо op.add_column.
+
+В offline-режиме (alembic upgrade --sql) выводится один оператор на всю таблицу.
+"""
+
+import logging
+import time
+
+from alembic import op
+from sqlalchemy import inspect, text
+
+log = logging.getLogger("alembic.migration_utils")
+
+PROGRESS_TABLE = "_migration_progress"
+BATCH_SIZE = 10_000
+
+
+def _ensure_progress_table(connection):
+    connection.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ("
+        "name VARCHAR PRIMARY KEY, last_key INTEGER NOT NULL, rows_done INTEGER NOT NULL)"
+    )
+
+
+def _load_progress(connection, name):
+    row = connection.execute(
+        text(f"SELECT last_key, rows_done FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name}
+    ).first()
+    return (row[0], row[1]) if row else (None, 0)
+
+
+def _save_progress(connection, name, last_key, rows_done):
+    connection.execute(
+        text(f"DELETE FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name}
+    )
+    connection.execute(
+        text(f"INSERT INTO {PROGRESS_TABLE} (name, last_key, rows_done) VALUES (:name, :last_key, :rows_done)"),
+        {"name": name, "last_key": last_key, "rows_done": rows_done},
+    )
+
+
+def add_column_if_missing(table, column):
+    """op.add_column, который при повторном запуске прерванной ревизии пропускает уже добавленную колонку"""
+    if not op.get_context().as_sql:
+        existing = {c["name"] for c in inspect(op.get_bind()).get_columns(table)}
+        if column.name in existing:
+            log.info("%s.%s уже есть - пропуск", table, column.name)
+            return
+    op.add_column(table, column)
+
+
+def run_in_chunks(name, table, key, statement, batch_size=BATCH_SIZE):
+    """Выполняет statement для порций ключей (:low, :high] таблицы table, каждую - своей транзакцией
+
+    statement - SQL с параметрами :low и :high, например
+        "UPDATE tasks SET completed = 0 WHERE task_id > :low AND task_id <= :high"
+    name - уникальное имя операции, по нему сохраняется прогресс для возобновления.
+    Фиксирует DDL, выполненный ревизией до вызова, - см. описание модуля (отдельная ревизия или add_column_if_missing).
+    """
+    context = op.get_context()
+    if context.as_sql:
+        # Offline-режим: порции не имеют смысла, выводим один оператор на весь диапазон ключей
+        op.execute(text(statement).bindparams(low=-(2 ** 63), high=2 ** 63 - 1))
+        return
+
+    # autocommit_block завершает транзакцию миграции - дальше транзакции открываются вручную, по одной на порцию
+    with context.autocommit_block():
+        connection = op.get_bind()
+        _ensure_progress_table(connection)
+        last_key, rows_done = _load_progress(connection, name)
+        if last_key is None:
+            last_key = connection.execute(text(f"SELECT MIN({key}) - 1 FROM {table}")).scalar()
+            if last_key is None:
+                log.info("%s: таблица %s пуста", name, table)
+                return
+        else:
+            log.info("%s: продолжение после %s=%s (%s строк уже обработано)", name, key, last_key, rows_done)
+        total = connection.execute(
+            text(f"SELECT COUNT(*) FROM {table} WHERE {key} > :low"), {"low": last_key}
+        ).scalar() + rows_done
+
+        # Граница следующей порции и число строк в ней - по индексу первичного ключа, без сканирования таблицы
+        next_chunk = text(
+            f"SELECT MAX({key}), COUNT(*) FROM "
+            f"(SELECT {key} FROM {table} WHERE {key} > :low ORDER BY {key} LIMIT :n)"
+        )
+        started = time.perf_counter()
+        while True:
+            high, rows = connection.execute(next_chunk, {"low": last_key, "n": batch_size}).one()
+            if high is None:
+                break
+            connection.exec_driver_sql("BEGIN")
+            try:
+                connection.execute(text(statement), {"low": last_key, "high": high})
+                rows_done += rows
+                _save_progress(connection, name, high, rows_done)
+                connection.exec_driver_sql("COMMIT")
+            except Exception:
+                connection.exec_driver_sql("ROLLBACK")
+                raise
+            last_key = high
+            elapsed = time.perf_counter() - started
+            log.info("%s: %s/%s строк (%.0f%%), %.1f с", name, rows_done, total,
+                     100 * rows_done / total if total else 100, elapsed)
+
+        connection.execute(text(f"DELETE FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name})
+        log.info("%s: готово, %s строк", name, rows_done)
+
+
+def backfill(name, table, set_clause, where=None, key="rowid", batch_size=BATCH_SIZE):
+    """UPDATE table SET set_clause [WHERE where] частями по ключу key"""
+    condition = f" AND ({where})" if where else ""
+    statement = f"UPDATE {table} SET {set_clause} WHERE {key} > :low AND {key} <= :high{condition}"
+    run_in_chunks(name, table, key, statement, batch_size)
+
+
+def copy_rows(name, source, target, columns, key="rowid", batch_size=BATCH_SIZE):
+    """INSERT INTO target SELECT columns FROM source частями по ключу key
+
+    Используется вместо batch_alter_table для больших таблиц: создать новую таблицу, скопировать строки
+    частями, затем в короткой транзакции переименовать (op.rename_table). Повторный запуск безопасен -
+    уже скопированные строки пропускаются (INSERT OR IGNORE по первичному ключу target).
+    """
+    column_list = ", ".join(columns)
+    statement = (
+        f"INSERT OR IGNORE INTO {target} ({column_list}) "
+        f"SELECT {column_list} FROM {source} WHERE {key} > :low AND {key} <= :high"
+    )
+    run_in_chunks(name, source, key, statement, batch_size)
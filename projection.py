@@ -0,0 +1,48 @@
+"""
+Проекции: ответ только с запрошенными полями (?fields=task_id,title,completed).
+
+Для каждого набора полей один раз создаётся Pydantic-модель только с этими полями (create_model) и TypeAdapter
+для списка таких моделей - оба кэшируются, поэтому повторные запросы с тем же fields не строят схему заново.
+Проверяется и сериализуется только подмножество полей, а клиент получает меньше байт.
+"""
+
+from functools import lru_cache
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+
+def parse_fields(model: type[BaseModel], fields: str | None) -> tuple[str, ...] | None:
+    """'title, task_id' -> ('task_id', 'title') в порядке полей модели; None - нужны все поля"""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - model.model_fields.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in model.model_fields if f in requested)
+
+
+@lru_cache(maxsize=256)
+def projected_model(model: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    return create_model(
+        f"{model.__name__}Projection",
+        __config__=ConfigDict(from_attributes=True),
+        **{f: (model.model_fields[f].annotation, model.model_fields[f]) for f in fields},
+    )
+
+
+@lru_cache(maxsize=256)
+def _adapter(model: type[BaseModel], fields: tuple[str, ...], many: bool) -> TypeAdapter:
+    projection = projected_model(model, fields)
+    return TypeAdapter(list[projection] if many else projection)
+
+
+def dump_json(model: type[BaseModel], fields: tuple[str, ...], data, many: bool = True) -> bytes:
+    """Сериализует объект/словарь/строку БД (или их список) только с полями fields
+
+    data может содержать Pydantic-объекты (Task), словари (users) или строки SQLAlchemy - значения
+    берутся по ключу или атрибуту (from_attributes).
+    """
+    adapter = _adapter(model, fields, many)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
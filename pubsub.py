@@ -0,0 +1,81 @@
+"""
+Внутрипроцессная рассылка событий подписчикам (pub/sub) для живых потоков (GET /task/stream).
+
+У каждого подписчика своя ограниченная очередь (MAX_PENDING событий). Медленный подписчик не тормозит остальных
+и не раздувает память: новое событие для той же записи заменяет ещё не отправленное (coalesce - клиенту важно
+последнее состояние), а при переполнении самое старое событие выбрасывается и подписчик получает флаг dropped -
+ему нужно догнать изменения через GET /task/changes.
+
+Подписчики хранятся по темам (например, user_id); подписчик без темы получает всё. publish() обходит только
+подписчиков нужных тем, а событие сериализуется один раз и только если есть кому его отправить.
+Ожидающий подписчик - это просто корутина на asyncio.Event, поэтому тысячи простаивающих соединений почти ничего
+не стоят.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
+
+MAX_PENDING = 100
+
+
+class Subscription:
+    def __init__(self, topic: Hashable | None, max_pending: int = MAX_PENDING):
+        self.topic = topic
+        self.max_pending = max_pending
+        self.dropped = False
+        self._pending: OrderedDict[Hashable, Any] = OrderedDict()
+        self._wakeup = asyncio.Event()
+
+    def offer(self, key: Hashable, event: Any):
+        if key in self._pending:
+            del self._pending[key]                  # Coalesce: остаётся последнее событие по записи
+        elif len(self._pending) >= self.max_pending:
+            self._pending.popitem(last=False)       # Переполнение: выбрасываем самое старое
+            self.dropped = True
+        self._pending[key] = event
+        self._wakeup.set()
+
+    async def get(self, timeout: float | None = None) -> list:
+        """Все накопившиеся события (в порядке поступления); [] - если за timeout ничего не пришло"""
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._wakeup.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+
+class Broker:
+    def __init__(self):
+        self._subscribers: dict[Hashable | None, set[Subscription]] = {}
+
+    @property
+    def count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, topic: Hashable | None = None, max_pending: int = MAX_PENDING) -> Subscription:
+        subscription = Subscription(topic, max_pending)
+        self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subs = self._subscribers.get(subscription.topic)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del self._subscribers[subscription.topic]
+
+    def publish(self, key: Hashable, make_event: Callable[[], Any], topics: Iterable[Hashable] = ()):
+        """Отправляет событие подписчикам без темы и подписчикам тем topics; make_event вызывается один раз"""
+        targets = set(self._subscribers.get(None, ()))
+        for topic in topics:
+            targets.update(self._subscribers.get(topic, ()))
+        if not targets:
+            return
+        event = make_event()
+        for subscription in targets:
+            subscription.offer(key, event)
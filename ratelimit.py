@@ -0,0 +1,170 @@
+"""
+Ограничение частоты запросов и допуск по нагрузке (admission control), чтобы один клиент не портил задержки всем.
+
+1. Token bucket на клиента (заголовок X-API-Key, если ключ есть в API_KEYS, иначе IP) - CLIENT_RATE запросов/с
+   со всплеском до CLIENT_BURST. Неизвестный ключ не даёт отдельного бакета: иначе, меняя ключи, клиент обходил бы
+   лимит и вытеснял бакеты остальных из LRU. Ключи задаются переменной окружения MTASKS_API_KEYS через запятую.
+2. Token bucket на клиента и маршрут для дорогих маршрутов (ROUTE_LIMITS) - например, POST /task/create.
+   Он проверяется первым: запрос, отклонённый маршрутом, не расходует общий лимит клиента.
+   Превышение - 429 с Retry-After: через сколько секунд появится токен.
+3. Общий предел одновременных запросов MAX_CONCURRENCY. Чтения (GET/HEAD) допускаются до предела, обычные записи -
+   до WRITE_SHARE от него, массовые (bulk/import/export) - до BULK_SHARE; POST .../batch-get - это чтение: при перегрузке первыми отсекаются тяжёлые
+   записи, а чтения продолжают обслуживаться. Отказ - сразу 503 с Retry-After, без ожидания в очереди.
+
+Всё состояние в памяти воркера; на запрос - O(1): два обращения к словарю и арифметика бакета.
+Бакеты неактивных клиентов вытесняются (LRU, не больше MAX_CLIENTS).
+"""
+
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+CLIENT_RATE = 50.0      # Запросов в секунду на клиента
+CLIENT_BURST = 100      # Размер всплеска
+# (метод, путь) -> (запросов в секунду, всплеск) на клиента
+ROUTE_LIMITS = {
+    ("POST", "/task/create"): (20.0, 40),
+    ("POST", "/user/create"): (20.0, 40),
+    ("POST", "/task/import"): (0.2, 2),
+    ("POST", "/user/import"): (0.2, 2),
+    ("POST", "/task/export"): (0.2, 2),
+    ("POST", "/user/export"): (0.2, 2),
+}
+MAX_CONCURRENCY = 64
+WRITE_SHARE = 0.75
+BULK_SHARE = 0.25
+MAX_CLIENTS = 10_000
+RETRY_AFTER_BUSY = 1
+# Долгие соединения (потоки событий) не занимают слоты одновременных запросов
+EXEMPT_PATHS = ("/task/stream",)
+BULK_SUFFIXES = ("/bulk", "/import", "/export")
+READ_SUFFIXES = ("/batch-get",)   # POST только из-за тела запроса со списком ключей
+# Известные ключи X-API-Key; остальные клиенты различаются по IP
+API_KEYS: frozenset[str] = frozenset(
+    key.strip() for key in os.environ.get("MTASKS_API_KEYS", "").split(",") if key.strip()
+)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Забирает токен; 0 - можно, иначе через сколько секунд появится следующий токен"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Возвращает токен, взятый take() для запроса, который всё-таки не был допущен"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        client_rate: float = CLIENT_RATE,
+        client_burst: int = CLIENT_BURST,
+        route_limits: dict = ROUTE_LIMITS,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_clients: int = MAX_CLIENTS,
+        api_keys: frozenset[str] = API_KEYS,
+    ):
+        self.app = app
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.route_limits = route_limits
+        self.max_clients = max_clients
+        self.api_keys = api_keys
+        self.limits = {
+            "read": max_concurrency,
+            "write": max(1, int(max_concurrency * WRITE_SHARE)),
+            "bulk": max(1, int(max_concurrency * BULK_SHARE)),
+        }
+        self.in_flight = 0
+        self._buckets: OrderedDict[tuple, TokenBucket] = OrderedDict()
+
+    def _bucket(self, key: tuple, rate: float, burst: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _client(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                key = value.decode("latin-1")
+                if key in self.api_keys:
+                    return "key:" + key
+                break
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    @staticmethod
+    def _kind(method: str, path: str) -> str:
+        if method in ("GET", "HEAD", "OPTIONS") or path.endswith(READ_SUFFIXES):
+            return "read"
+        if path.endswith(BULK_SUFFIXES):
+            return "bulk"
+        return "write"
+
+    async def _reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        path = scope["path"].rstrip("/") or "/"     # /task/create/ и /task/create - один маршрут и один бакет
+        now = time.monotonic()
+        client = self._client(scope)
+
+        # Сначала бакет маршрута, затем общий бакет клиента - токен берётся, только если запрос допущен обоими
+        route_bucket = None
+        wait = 0.0
+        route_limit = self.route_limits.get((method, path))
+        if route_limit is not None:
+            route_bucket = self._bucket((client, method, path), *route_limit, now)
+            wait = route_bucket.take(now)
+        if not wait:
+            wait = self._bucket((client,), self.client_rate, self.client_burst, now).take(now)
+            if wait and route_bucket is not None:
+                route_bucket.refund()
+        if wait:
+            await self._reject(send, 429, "Too many requests", wait)
+            return
+
+        if self.in_flight >= self.limits[self._kind(method, path)]:
+            await self._reject(send, 503, "Server is busy", RETRY_AFTER_BUSY)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
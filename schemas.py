@@ -24,6 +24,7 @@ class UserBase(BaseModel):
 
 class User(UserBase):
     user_id: int  # Было user_id, теперь id (как в модели SQLAlchemy) - все перевел на обратно
+    version: int = 1  # Растёт при каждом изменении; ETag ответа и If-Match запроса - это версия
 
     class Config:
         from_attributes = True  # Было orm_mode=True (Pydantic v2)
@@ -45,6 +46,14 @@ class CreateUser(UserBase):
     pass
 
 
+class ReplaceUser(BaseModel):
+    """PUT - полная замена: все поля, кроме username (он в пути), обязательны"""
+    firstname: str
+    lastname: str
+    age: int
+    slug: str
+
+
 class UpdateUser(BaseModel):
     firstname: Optional[str] = None
     lastname: Optional[str] = None
@@ -86,6 +95,7 @@ class TaskBase(BaseModel):
 
 class Task(TaskBase):
     task_id: int
+    version: int = 1  # Растёт при каждом изменении; ETag ответа и If-Match запроса - это версия
 
     class Config:
         from_attributes = True
@@ -95,6 +105,11 @@ class CreateTask(TaskBase):
     pass
 
 
+class ReplaceTask(TaskBase):
+    """PUT - полная замена: непереданные priority / completed получают значения по умолчанию, а не старые"""
+    pass
+
+
 class UpdateTask(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = Field(
@@ -114,3 +129,97 @@ class UpdateTask(BaseModel):
 
 
 
+
+
+class TaskFilter(BaseModel):
+    user_id: Optional[int] = None
+    priority: Optional[int] = Field(None, ge=0, le=3)
+    completed: Optional[bool] = None
+
+
+class BulkTaskItem(BaseModel):
+    task_id: int
+    changes: UpdateTask
+
+
+class BulkUpdateTasks(BaseModel):
+    """Либо список items (у каждой задачи свои изменения), либо filter + changes (одни изменения для всех)"""
+    items: list[BulkTaskItem] = []
+    filter: Optional[TaskFilter] = None
+    changes: Optional[UpdateTask] = None
+
+
+class BulkResult(BaseModel):
+    matched: int
+    updated: int
+    not_found: list[int] = []
+
+
+class BulkDeleteTasks(BaseModel):
+    """Удаляются задачи из task_ids, а также подходящие под фильтр (completed и/или user_id из user_ids)"""
+    task_ids: list[int] = []
+    completed: Optional[bool] = None
+    user_ids: list[int] = []
+
+
+class BulkDeleteUsers(BaseModel):
+    user_ids: list[int] = []
+    usernames: list[str] = []
+
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+    not_found: list[int | str] = []
+
+
+BATCH_GET_LIMIT = 1000  # Ключей в одном запросе batch-get
+
+
+class BatchGet(BaseModel):
+    """Задачи или пользователи по id и/или slug; ответ - в порядке запроса: сначала ids, затем slugs"""
+    ids: list[int] = Field([], max_length=BATCH_GET_LIMIT)
+    slugs: list[str] = Field([], max_length=BATCH_GET_LIMIT)
+
+
+class TaskBatch(BaseModel):
+    items: list[Optional[Task]]     # Позиция = позиция ключа в запросе, None - не найдено
+    not_found: list[int | str] = []
+
+
+class UserBatch(BaseModel):
+    items: list[Optional[User]]
+    not_found: list[int | str] = []
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    total: int
+    done: int
+    progress: float
+    error: Optional[str] = None
+    status_url: str
+    result_url: Optional[str] = None
+
+
+class ImportResult(BaseModel):
+    created: int
+    errors: list[dict] = []     # {"index": номер в запросе, "detail": причина}
+
+
+class TaskChange(BaseModel):
+    version: int
+    op: str                     # insert / update / delete
+    task_id: int
+    task: Optional[Task] = None  # None для delete (tombstone)
+
+
+class TaskChanges(BaseModel):
+    version: int                # Текущая версия - передать как since в следующем запросе
+    changes: list[TaskChange]
+
+
+class TaskStats(BaseModel):
+    total: int
+    groups: list[dict] = []     # {"user_id": 1, "completed": false, "count": 10} - поля из group_by и count
@@ -0,0 +1,80 @@
+"""
+Поиск по префиксу (и с одной опечаткой) в отсортированном массиве строк.
+
+Ключи хранятся в списке пар (ключ, id), отсортированном по ключу; вставка и удаление - bisect (O(log n) на поиск
+места), поиск по префиксу - bisect до первого ключа >= префикса и проход вперёд, пока ключи начинаются с префикса.
+На миллионе ключей это ~20 сравнений плюс limit шагов - доли миллисекунды, без отдельного дерева (trie) в памяти.
+
+Нечёткий поиск: для префикса строятся все варианты на расстоянии одной правки (удаление, замена, вставка символа,
+перестановка соседних), и каждый ищется тем же bisect. Алфавит для замен и вставок - только символы, которые
+встречаются в ключах (счётчик поддерживается при add / remove), поэтому дополнительных индексов не нужно.
+
+Сравнение без учёта регистра: ключи и префиксы приводятся через casefold().
+"""
+
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain, islice
+from typing import Iterator
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._keys: list[tuple[str, int]] = []
+        self._chars: Counter[str] = Counter()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, item_id: int):
+        key = key.casefold()
+        insort(self._keys, (key, item_id))
+        self._chars.update(key)
+
+    def remove(self, key: str, item_id: int):
+        key = key.casefold()
+        i = bisect_left(self._keys, (key, item_id))
+        if i < len(self._keys) and self._keys[i] == (key, item_id):
+            del self._keys[i]
+            self._chars.subtract(key)
+            for ch in set(key):
+                if self._chars[ch] <= 0:
+                    del self._chars[ch]
+
+    def _scan(self, prefix: str) -> Iterator[tuple[str, int]]:
+        keys = self._keys
+        i = bisect_left(keys, (prefix,))   # (prefix,) меньше любой пары (prefix, id)
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i]
+            i += 1
+
+    def prefix(self, prefix: str, limit: int) -> list[int]:
+        """id, чьи ключи начинаются с prefix, в порядке ключей"""
+        return [item_id for _, item_id in islice(self._scan(prefix.casefold()), limit)]
+
+    def _variants(self, prefix: str) -> set[str]:
+        """Все строки на расстоянии одной правки от prefix (вставка в конец не нужна - её покрывает сам префикс)"""
+        alphabet = self._chars.keys()
+        splits = [(prefix[:i], prefix[i:]) for i in range(len(prefix))]
+        deletes = (a + b[1:] for a, b in splits)
+        transposes = (a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1)
+        replaces = (a + ch + b[1:] for a, b in splits for ch in alphabet if ch != b[0])
+        inserts = (a + ch + b for a, b in splits for ch in alphabet)
+        variants = set(chain(deletes, transposes, replaces, inserts))
+        variants.discard(prefix)
+        variants.discard("")    # Пустой префикс совпал бы со всеми ключами
+        return variants
+
+    def fuzzy(self, prefix: str, limit: int) -> list[int]:
+        """Как prefix(), но допускает одну опечатку в префиксе; точные совпадения идут первыми"""
+        prefix = prefix.casefold()
+        exact = self.prefix(prefix, limit)
+        if len(exact) >= limit:
+            return exact
+        seen = set(exact)
+        near = {}
+        for variant in self._variants(prefix):
+            for key, item_id in islice(self._scan(variant), limit):
+                if item_id not in seen:
+                    near[item_id] = key
+        return exact + sorted(near, key=near.get)[:limit - len(exact)]
@@ -0,0 +1,148 @@
+"""
+Заполнение базы (taskmanager.db) или хранилищ в памяти реалистичными объёмами данных - для бенчмарков и проверок.
+
+Строки генерируются сразу валидными для CreateUser / CreateTask: slug и title уникальны (строятся из id), content
+от 5 до 100 символов, priority от 0 до 3, user_id - один из созданных пользователей. Генерация детерминирована
+(--seed), id продолжаются после максимального уже существующего.
+
+В БД строки пишутся через executemany сырого соединения sqlite3 порциями по BATCH_SIZE, одна транзакция на порцию,
+на время загрузки synchronous=OFF - десятки миллионов строк за минуты, а не часы через ORM.
+
+Запуск (из корня проекта, как и create_db; таблицы уже должны быть созданы - create_db или alembic upgrade head):
+    python -m mtasks.backend.seed --users 10000 --tasks 1000000
+    python -m mtasks.backend.seed --users 100000 --tasks 10000000 --url sqlite:///bench.db
+
+Из кода (бенчмарки, тесты) - в хранилища маршрутов, без БД:
+    from mtasks.backend import seed
+    seed.load_store(users=1000, tasks=100_000)
+"""
+
+import argparse
+import random
+import time
+from itertools import islice
+from typing import Iterator, Sequence
+
+BATCH_SIZE = 50_000
+FIRST_NAMES = ("Иван", "Пётр", "Анна", "Мария", "Олег", "Ольга", "Сергей", "Елена", "Дмитрий", "Наталья")
+LAST_NAMES = ("Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Волков", "Соколов", "Лебедев", "Козлов", "Новиков")
+WORDS = ("сделать", "проверить", "отчёт", "задача", "встреча", "код", "тесты", "релиз", "база", "документ",
+         "исправить", "обновить", "клиент", "сервер", "план", "срочно")
+USER_FIELDS = ("user_id", "username", "firstname", "lastname", "age", "slug")
+TASK_FIELDS = ("task_id", "title", "content", "priority", "completed", "slug", "user_id")
+
+
+def _content(rng: random.Random) -> str:
+    # Слова до нужной длины, затем обрезка - длина ровно от 5 до 100, как требует CreateTask
+    length = rng.randint(5, 100)
+    text = " ".join(rng.choices(WORDS, k=length // 4 + 2))
+    return text[:length].ljust(length, ".")
+
+
+def generate_users(count: int, first_id: int = 1, seed: int = 0) -> Iterator[tuple]:
+    """Кортежи в порядке USER_FIELDS; username и slug растут вместе с id (user00000001, ...)"""
+    rng = random.Random(seed)
+    for user_id in range(first_id, first_id + count):
+        name = f"user{user_id:08d}"
+        yield user_id, name, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.randint(18, 80), name
+
+
+def generate_tasks(count: int, user_ids: Sequence[int], first_id: int = 1, seed: int = 0) -> Iterator[tuple]:
+    """Кортежи в порядке TASK_FIELDS; user_id - случайный из user_ids"""
+    rng = random.Random(seed + 1)
+    for task_id in range(first_id, first_id + count):
+        yield (task_id, f"Задача {task_id:09d}", _content(rng), rng.randint(0, 3), rng.random() < 0.3,
+               f"task-{task_id:09d}", rng.choice(user_ids))
+
+
+def _batches(rows: Iterator[tuple], size: int) -> Iterator[list[tuple]]:
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _insert(connection, table, fields: tuple[str, ...], rows: Iterator[tuple], batch_size: int) -> int:
+    if "version" in table.c:    # Колонка из миграции 9d4f7a2c6e1b - новые записи начинают с версии 1
+        fields += ("version",)
+        rows = (row + (1,) for row in rows)
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" for _ in fields)
+    sql = f"INSERT INTO {table.name} ({columns}) VALUES ({placeholders})"
+    inserted = 0
+    cursor = connection.cursor()
+    for batch in _batches(rows, batch_size):
+        cursor.execute("BEGIN")
+        cursor.executemany(sql, batch)
+        cursor.execute("COMMIT")
+        inserted += len(batch)
+    cursor.close()
+    return inserted
+
+
+def seed_db(users: int, tasks: int, url: str | None = None, seed: int = 0, batch_size: int = BATCH_SIZE) -> dict:
+    """Добавляет users пользователей и tasks задач в БД; возвращает {"users": ..., "tasks": ..., "seconds": ...}"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    from mtasks.backend import db
+    from mtasks.models import User_sql, Task_sql
+
+    # Отдельный engine без пула: PRAGMA ниже не должны достаться соединениям приложения
+    engine = create_engine(url or db.DATABASE_URL, poolclass=NullPool)
+    start = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        connection = raw.driver_connection
+        connection.isolation_level = None   # Транзакции - явно, по одной на порцию
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute("PRAGMA journal_mode=WAL")
+        first_user = connection.execute("SELECT coalesce(max(user_id), 0) + 1 FROM users").fetchone()[0]
+        first_task = connection.execute("SELECT coalesce(max(task_id), 0) + 1 FROM tasks").fetchone()[0]
+        added_users = _insert(connection, User_sql.__table__, USER_FIELDS,
+                              generate_users(users, first_user, seed), batch_size)
+        # Без новых пользователей - существующие id из таблицы: после удалений в 1..max(user_id) есть пропуски
+        user_ids = (range(first_user, first_user + users) if users
+                    else [row[0] for row in connection.execute("SELECT user_id FROM users")])
+        if tasks and not user_ids:
+            raise ValueError("Задачам нужен хотя бы один пользователь: --users > 0 или уже заполненная users")
+        added_tasks = _insert(connection, Task_sql.__table__, TASK_FIELDS,
+                              generate_tasks(tasks, user_ids, first_task, seed), batch_size)
+    finally:
+        raw.close()
+        engine.dispose()
+    return {"users": added_users, "tasks": added_tasks, "seconds": round(time.perf_counter() - start, 1)}
+
+
+def load_store(users: int, tasks: int, seed: int = 0):
+    """Заполняет хранилища маршрутов в памяти (routers/users.py, routers/tasks.py) - без журнала изменений"""
+    from mtasks.routers import tasks as task_routes, users as user_routes
+    from mtasks.schemas import Task
+
+    with user_routes._write_lock:   # Та же блокировка, что у маршрутов: они могут выполняться в пуле потоков
+        first_user = next(reversed(user_routes.users), 0) + 1
+        for row in generate_users(users, first_user, seed):
+            user_routes._add_user({**dict(zip(USER_FIELDS, row)), "version": 1})
+        # Как в seed_db: без новых пользователей - реально существующие id, а не 1..max
+        user_ids = range(first_user, first_user + users) if users else list(user_routes.users)
+    if tasks and not user_ids:
+        raise ValueError("Задачам нужен хотя бы один пользователь: users > 0 или уже заполненное хранилище")
+    first_task = next(reversed(task_routes.tasks), 0) + 1
+    task_routes._load(Task(**dict(zip(TASK_FIELDS, row))) for row in generate_tasks(tasks, user_ids, first_task, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение taskmanager.db пользователями и задачами")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--url", default=None, help="По умолчанию DATABASE_URL из mtasks.backend.db")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    result = seed_db(args.users, args.tasks, args.url, args.seed, args.batch_size)
+    rate = result["tasks"] / result["seconds"] if result["seconds"] else 0
+    print(f"Добавлено пользователей: {result['users']}, задач: {result['tasks']} "
+          f"за {result['seconds']} с ({rate:,.0f} задач/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Потоковая сериализация больших списков (GET /task/, GET /user/) вне цикла событий.
+
+Сериализация миллиона объектов в одном вызове занимает секунды, и всё это время воркер не отвечает на другие
+запросы. Здесь список режется на порции по CHUNK_SIZE: в цикле событий из каждой порции берутся только значения
+полей (кортежи - быстро и дёшево передавать в другой процесс), а JSON строится в ProcessPoolExecutor.
+Готовые порции отдаются клиенту по порядку через StreamingResponse, одновременно в работе не больше
+MAX_IN_FLIGHT порций - память не растёт с размером ответа.
+
+Если процессы недоступны (USE_PROCESSES = False или пул не создаётся), порции сериализуются в потоке.
+"""
+
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter, itemgetter
+
+from fastapi.responses import StreamingResponse
+
+STREAM_THRESHOLD = 10_000   # С какого размера списка ответ сериализуется порциями
+CHUNK_SIZE = 5_000
+MAX_WORKERS = 2
+MAX_IN_FLIGHT = 4           # Порций одновременно в пуле
+USE_PROCESSES = True
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor | None:
+    global _executor, USE_PROCESSES
+    if _executor is None and USE_PROCESSES:
+        try:
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        except (OSError, NotImplementedError):
+            USE_PROCESSES = False   # Например, нет прав на создание процессов - дальше работаем в потоке
+    return _executor
+
+
+def shutdown():
+    """Останавливает пул процессов (вызывается при остановке приложения)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def _dump_rows(fields: tuple[str, ...], rows: list[tuple]) -> bytes:
+    # Выполняется в дочернем процессе: кортежи значений -> элементы JSON-массива без [ ]
+    return json.dumps(
+        [dict(zip(fields, row)) for row in rows], ensure_ascii=False, separators=(",", ":")
+    ).encode()[1:-1]
+
+
+async def _stream(items: list, fields: tuple[str, ...], by_key: bool):
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    getter = (itemgetter if by_key else attrgetter)(*fields)
+    if len(fields) == 1:    # attrgetter/itemgetter с одним полем возвращает значение, а не кортеж
+        single = getter
+        getter = lambda item: (single(item),)   # noqa: E731
+    pending = []
+
+    def submit(start: int):
+        rows = [getter(item) for item in items[start:start + CHUNK_SIZE]]
+        return loop.run_in_executor(executor, _dump_rows, fields, rows)
+
+    yield b"["
+    first = True
+    for start in range(0, len(items), CHUNK_SIZE):
+        pending.append(submit(start))
+        if len(pending) >= MAX_IN_FLIGHT:
+            part = await pending.pop(0)
+            yield part if first else b"," + part
+            first = False
+        else:
+            await asyncio.sleep(0)  # Отдаём цикл событий другим запросам между порциями
+    for future in pending:
+        part = await future
+        if part:
+            yield part if first else b"," + part
+            first = False
+    yield b"]"
+
+
+def stream_json_list(items: list, fields: tuple[str, ...], by_key: bool = False) -> StreamingResponse:
+    """JSON-массив объектов (или словарей, by_key=True) только с полями fields, порциями вне цикла событий"""
+    return StreamingResponse(_stream(items, fields, by_key), media_type="application/json")
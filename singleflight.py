@@ -0,0 +1,61 @@
+"""
+Single-flight для чтения: одинаковые одновременные запросы выполняют одну общую работу.
+
+Когда популярная страница списка строится заново, сотни одинаковых GET /task/?... не должны сериализовать
+один и тот же список сотни раз. Первый запрос с данным ключом (маршрут + нормализованные параметры) запускает
+построение ответа, остальные, пришедшие пока оно идёт, ждут его и получают те же готовые байты.
+
+Построение идёт отдельной задачей asyncio: если первый клиент отключится, ожидающие всё равно получат результат.
+Ключ живёт только пока ответ строится - это не кэш, устаревших данных не бывает.
+
+Для списков меньше OFFLOAD_THRESHOLD это не нужно: такой ответ строится без await, и другой запрос
+не может начаться, пока он не готов.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+OFFLOAD_THRESHOLD = 1_000   # С какого числа записей JSON строится в потоке и одинаковые запросы объединяются
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.started = 0    # Сколько раз работа действительно выполнялась
+        self.shared = 0     # Сколько запросов получили чужой результат
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)   # Отмена одного ожидающего не отменяет общую работу
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()    # Ошибку получат ожидающие; если их не осталось - без "exception was never retrieved"
+
+
+flights = SingleFlight()
+
+
+async def shared_json(key: Hashable, snapshot: Callable[[], T], dump: Callable[[T], bytes]) -> bytes:
+    """
+    snapshot() выполняется в цикле событий, dump(snapshot) - в потоке, чтобы цикл событий обслуживал другие
+    запросы, а одинаковые - ждали этот. Пока dump работает, PATCH / PUT меняют записи хранилища на месте,
+    поэтому snapshot() должен вернуть копии (словари с неизменяемыми значениями), а не сами объекты хранилища -
+    иначе в ответ попадёт запись, наполовину изменённая другим запросом.
+    """
+    async def build() -> bytes:
+        data = snapshot()
+        return await asyncio.to_thread(dump, data)
+
+    return await flights.do(key, build)
@@ -10,45 +10,486 @@
 функция асинхронные операции (например, запросы к базе данных, вызовы внешних API и т. д.). Здесь этого нет.
 """
 
-from fastapi import APIRouter, HTTPException
-from mtasks.schemas import Task, CreateTask, UpdateTask
+import asyncio
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from functools import partial
+from itertools import islice
 
-from mtasks.models import Task_sql
+from typing import Iterable, Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from mtasks.schemas import (Task, CreateTask, UpdateTask, ReplaceTask, BulkUpdateTasks, BulkResult,
+                           BulkDeleteTasks, BulkDeleteResult, JobInfo, ImportResult, TaskChange, TaskChanges,
+                           TaskStats, BatchGet, TaskBatch)
+from mtasks.changes import ChangeLog
+from mtasks.pubsub import Broker
+from mtasks import etags, idempotency, projection, serialization, singleflight
+from mtasks.routers import jobs
+
+# from mtasks.models import Task_sql - не используется в маршрутах, но тянул SQLAlchemy и db.py при старте приложения
 
 router = APIRouter(
     prefix="/task",
     tags=["Task"],
 )
 
-# список объектов
-# Типизация users: list[Task] = []:
-# Запись users: list[Task] = [] значит, что переменная users есть список и должен содержать только объекты типа Task
-# Это аннотация типа, которая помогает: Улучшить читаемость кода. Проверить типы данных на этапе разработки (например,
-# с помощью инструментов вроде mypy). Получить подсказки в IDE (например, PyCharm. Однако, Python не проверяет типы
-# данных во время выполнения, поэтому эта аннотация не накладывает ограничений на содержимое списка
-tasks: list[Task] = []  # Список tasks хранит объекты типа Task.
+# Хранилище задач - словарь task_id -> Task (порядок добавления сохраняется) и индексы по slug, title и user_id.
+# Поиск, проверка уникальности и удаление - O(1) вместо прохода по всему списку.
+# Изменять задачи нужно через _add / _apply_changes / _remove, чтобы индексы оставались согласованными.
+# Типизация tasks: dict[int, Task] = {} - аннотация для IDE и mypy, Python типы во время выполнения не проверяет
+tasks: dict[int, Task] = {}
+task_ids_by_slug: dict[str, int] = {}
+task_ids_by_title: dict[str, int] = {}
+task_ids_by_user: dict[int, set[int]] = {}
+# Счётчики задач по (user_id, priority, completed) обновляются при каждом изменении - для GET /task/stats
+task_counts: Counter[tuple[int, int, bool]] = Counter()
+# Отсортированные индексы для order_by: списки ключей (priority, task_id) и (title, task_id), вставка и удаление -
+# бинарным поиском (bisect). По task_id сортировать не нужно: новые id всегда больше старых, tasks уже упорядочен.
+tasks_by_priority: list[tuple[int, int]] = []
+tasks_by_title: list[tuple[str, int]] = []
+
+# Мягкое удаление (SOFT_DELETE = True): задача остаётся в tasks (порядок ключей и id не меняются) и попадает
+# в tombstones. Из индексов по slug / title / user_id и из счётчиков она убирается сразу - это O(1), а из
+# отсортированных индексов (удаление из списка - сдвиг O(n)) её вместе с самой задачей убирает фоновый компактор,
+# порциями. Пока компактор не дошёл, задачу можно восстановить: POST /task/{task_id}/restore
+SOFT_DELETE = False
+tombstones: dict[int, float] = {}   # task_id -> time.monotonic() удаления, по возрастанию времени
+
+
+def _index(t: Task):
+    _index_lookup(t)
+    insort(tasks_by_priority, _priority_key(t))
+    insort(tasks_by_title, _title_key(t))
+
+
+def _unindex(t: Task):
+    _unindex_lookup(t)
+    _unindex_sorted(t)
+
+
+def _index_lookup(t: Task):
+    task_ids_by_slug[t.slug] = t.task_id
+    task_ids_by_title[t.title] = t.task_id
+    task_ids_by_user.setdefault(t.user_id, set()).add(t.task_id)
+    task_counts[(t.user_id, t.priority, t.completed)] += 1
+
+
+def _unindex_lookup(t: Task):
+    task_ids_by_slug.pop(t.slug, None)
+    task_ids_by_title.pop(t.title, None)
+    user_tasks = task_ids_by_user.get(t.user_id)
+    if user_tasks is not None:
+        user_tasks.discard(t.task_id)
+        if not user_tasks:
+            del task_ids_by_user[t.user_id]
+    key = (t.user_id, t.priority, t.completed)
+    task_counts[key] -= 1
+    if not task_counts[key]:
+        del task_counts[key]
+
+
+def _unindex_sorted(t: Task):
+    _discard_sorted(tasks_by_priority, _priority_key(t))
+    _discard_sorted(tasks_by_title, _title_key(t))
+
+
+def _priority_key(t: Task) -> tuple[int, int]:
+    return t.priority, t.task_id
+
+
+def _title_key(t: Task) -> tuple[str, int]:
+    return t.title, t.task_id
+
+
+def _discard_sorted(index: list, key: tuple):
+    i = bisect_left(index, key)
+    if i < len(index) and index[i] == key:
+        del index[i]
+
+
+def _resort(index: list, old_key: tuple, new_key: tuple):
+    # Сдвиг списка при удалении и вставке - O(n): если ключ не изменился, запись остаётся на месте
+    if old_key != new_key:
+        _discard_sorted(index, old_key)
+        insort(index, new_key)
+
+
+def _check_unique(t: Task, updates: dict):
+    if "title" in updates and task_ids_by_title.get(updates["title"], t.task_id) != t.task_id:
+        raise HTTPException(status_code=400, detail="Task already exists")
+    if "slug" in updates and task_ids_by_slug.get(updates["slug"], t.task_id) != t.task_id:
+        raise HTTPException(status_code=400, detail="Slug already exists")
+
+
+# Журнал изменений для GET /task/changes: каждая операция ниже получает следующую версию.
+# Те же изменения рассылаются подписчикам GET /task/stream (тема - user_id задачи)
+task_changes = ChangeLog()
+task_events = Broker()
+
+
+def _notify(op: str, task_id: int, item: dict | None, user_ids: Iterable[int]):
+    version = task_changes.record(op, task_id, item)
+
+    def sse_frame():    # Кадр Server-Sent Events собирается один раз на всех подписчиков
+        data = TaskChange(version=version, op=op, task_id=task_id, task=item).model_dump_json()
+        return version, f"id: {version}\nevent: {op}\ndata: {data}\n\n"
+
+    task_events.publish(task_id, sse_frame, user_ids)
+
+
+def _add(t: Task):
+    tasks[t.task_id] = t
+    _index(t)
+    _notify("insert", t.task_id, t.model_dump(), (t.user_id,))
+
+
+def _load(items: Iterable[Task]):
+    """
+    Массовая загрузка (backend/seed.py): без журнала изменений и рассылки, отсортированные индексы - одной
+    сортировкой в конце вместо insort на каждую задачу. Уникальность и id не проверяются - это дело вызывающего.
+    """
+    for t in items:
+        tasks[t.task_id] = t
+        _index_lookup(t)
+        tasks_by_priority.append(_priority_key(t))
+        tasks_by_title.append(_title_key(t))
+    tasks_by_priority.sort()
+    tasks_by_title.sort()
+    _stats_cache.clear()    # Версия журнала не изменилась, а счётчики - да
+
+
+def _apply_changes(t: Task, updates: dict):
+    old_user_id = t.user_id
+    old_priority, old_title = _priority_key(t), _title_key(t)
+    _unindex_lookup(t)
+    for field, value in updates.items():
+        setattr(t, field, value)
+    t.version += 1     # Любое изменение - новая версия (ETag), старый If-Match после этого получит 412
+    _index_lookup(t)
+    _resort(tasks_by_priority, old_priority, _priority_key(t))
+    _resort(tasks_by_title, old_title, _title_key(t))
+    # Если задача перешла к другому пользователю - узнают подписчики обоих
+    _notify("update", t.task_id, t.model_dump(), {old_user_id, t.user_id})
+
+
+def _remove(t: Task):
+    if SOFT_DELETE:
+        _unindex_lookup(t)
+        tombstones[t.task_id] = time.monotonic()
+    else:
+        _unindex(t)
+        del tasks[t.task_id]
+    _notify("delete", t.task_id, None, (t.user_id,))
+
+
+def _live(task_id: int | None) -> Task | None:
+    """Задача по id, если она есть и не удалена мягко"""
+    t = tasks.get(task_id)
+    return None if t is None or task_id in tombstones else t
+
+
+def _live_tasks() -> Iterable[Task]:
+    if not tombstones:
+        return tasks.values()
+    return (t for t in tasks.values() if t.task_id not in tombstones)
+
+
+def _get_task(task_id: int) -> Task:
+    t = _live(task_id)
+    if t is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return t
+
+
+TOMBSTONE_TTL = 60      # Секунд, в течение которых мягко удалённую задачу можно восстановить
+COMPACT_INTERVAL = 5    # Секунд между проходами компактора
+COMPACT_BATCH = 500     # Задач за одну порцию, между порциями компактор уступает цикл событий запросам
+_compactor: asyncio.Task | None = None
+
+
+def compact(ttl: float = TOMBSTONE_TTL, batch: int = COMPACT_BATCH) -> int:
+    """Окончательно убирает до batch задач, удалённых раньше чем ttl секунд назад; возвращает их число"""
+    deadline = time.monotonic() - ttl
+    expired = []
+    for task_id, deleted_at in tombstones.items():    # Самые старые - первыми
+        if deleted_at > deadline or len(expired) == batch:
+            break
+        expired.append(task_id)
+    for task_id in expired:
+        del tombstones[task_id]
+        _unindex_sorted(tasks.pop(task_id))
+    return len(expired)
+
+
+async def _compact_forever():
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL)
+        while compact() == COMPACT_BATCH:   # Полная порция - возможно, есть ещё
+            await asyncio.sleep(0)
+
+
+async def start_compactor():
+    global _compactor
+    if _compactor is None:
+        _compactor = asyncio.create_task(_compact_forever())
+
+
+async def stop_compactor():
+    global _compactor
+    if _compactor is not None:
+        _compactor.cancel()
+        try:
+            await _compactor
+        except asyncio.CancelledError:
+            pass
+        _compactor = None
+
+
+FIELDS_QUERY = Query(None, description="Поля ответа через запятую, например task_id,title,completed")
+
+
+SORT_INDEXES = {"priority": tasks_by_priority, "title": tasks_by_title}
+
+
+def _ordered_tasks(order_by: str | None, desc: bool) -> Iterable[Task]:
+    """Задачи в нужном порядке - проход по готовому индексу, без сортировки"""
+    if order_by in SORT_INDEXES:
+        keys = SORT_INDEXES[order_by]
+        items = (tasks[task_id] for _, task_id in (reversed(keys) if desc else keys))
+    else:
+        items = reversed(tasks.values()) if desc else tasks.values()
+    if tombstones:  # Мягко удалённые задачи ещё есть в tasks и отсортированных индексах - пропускаем
+        items = (t for t in items if t.task_id not in tombstones)
+    return items
 
 
 @router.get("/", response_model=list[Task])
-async def get():
-    return tasks
+async def get(fields: str | None = FIELDS_QUERY,
+              order_by: Literal["task_id", "priority", "title"] | None = None,
+              desc: bool = False,
+              completed: bool | None = None,
+              limit: int | None = Query(None, ge=1)):
+    """
+    Список задач; order_by / desc - порядок, completed - фильтр, limit - первые N.
+    Top-k ("20 самых приоритетных открытых": order_by=priority&desc=true&completed=false&limit=20) читает индекс
+    с нужного конца и останавливается после limit подходящих задач - полной сортировки нет.
+    """
+    selected = projection.parse_fields(Task, fields)
+
+    def select() -> list[Task]:
+        items = _ordered_tasks(order_by, desc)
+        if completed is not None:
+            items = (t for t in items if t.completed == completed)
+        return list(islice(items, limit))
+
+    expected = min(len(tasks), limit or len(tasks))     # Верхняя оценка размера ответа - до выборки
+    if expected >= serialization.STREAM_THRESHOLD:     # Большой список - порциями в пуле процессов
+        return serialization.stream_json_list(select(), selected or tuple(Task.model_fields))
+    if expected >= singleflight.OFFLOAD_THRESHOLD:
+        # Одинаковые одновременные запросы (те же параметры после разбора) ждут один общий ответ
+        key = ("/task/", selected, order_by, desc, completed, limit)
+        dump = partial(projection.dump_json, Task, selected or tuple(Task.model_fields))
+        # Копии полей - в цикле событий, как в export_tasks: сериализация идёт в потоке, а PATCH меняет Task на месте
+        rows = lambda: [t.__dict__.copy() for t in select()]
+        return Response(await singleflight.shared_json(key, rows, dump), media_type="application/json")
+    items = select()
+    if selected:
+        return Response(projection.dump_json(Task, selected, items), media_type="application/json")
+    return items
+
+
+BULK_CHUNK = 1000   # Изменений за порцию PATCH /task/bulk, между порциями - уступка циклу событий
+
+
+@router.patch("/bulk", response_model=BulkResult)     # До /{task_id}, иначе "bulk" попадёт в task_id
+async def update_tasks_bulk(bulk: BulkUpdateTasks):
+    """Массовое обновление за один проход: список {task_id, changes} или filter + changes"""
+    matched = updated = 0
+    not_found = []
+    # Все проверки - до первого изменения: ошибка не должна оставить часть пакета применённой
+    filter_updates = {}
+    if bulk.filter is not None:
+        filter_updates = bulk.changes.model_dump(exclude_unset=True, exclude_none=True) if bulk.changes else {}
+        if "title" in filter_updates or "slug" in filter_updates:
+            raise HTTPException(status_code=400, detail="title и slug уникальны - их нельзя менять по фильтру")
+
+    planned = []
+    # Предварительные переименования: значение -> task_id (None - освобождено), поверх task_ids_by_title/slug.
+    # Так две задачи одного пакета не получат одинаковый title, даже если в хранилище его ещё нет
+    renamed = {"title": {}, "slug": {}}
+    current = {}    # task_id -> {"title": ..., "slug": ...} с учётом предыдущих элементов пакета
+    for item in bulk.items:
+        t = _live(item.task_id)
+        if t is None:
+            not_found.append(item.task_id)
+            continue
+        updates = item.changes.model_dump(exclude_unset=True, exclude_none=True)
+        values = current.setdefault(t.task_id, {"title": t.title, "slug": t.slug})
+        for field, index, detail in (("title", task_ids_by_title, "Task already exists"),
+                                     ("slug", task_ids_by_slug, "Slug already exists")):
+            value = updates.get(field)
+            if value is None or value == values[field]:
+                continue
+            claimed = renamed[field]
+            owner = claimed[value] if value in claimed else index.get(value)
+            if owner is not None and owner != t.task_id:
+                raise HTTPException(status_code=400, detail=detail)
+            claimed[values[field]] = None
+            claimed[value] = t.task_id
+            values[field] = value
+        planned.append((t, updates))
+    # Между порциями обработчик уступает цикл событий (см. BULK_CHUNK). Переименования проверены без await - их
+    # нужно применить до первой уступки, иначе другой запрос успеет занять проверенный title / slug
+    last_rename = max((i for i, (_, updates) in enumerate(planned) if "title" in updates or "slug" in updates),
+                      default=-1)
+    for i, (t, updates) in enumerate(planned):
+        if _live(t.task_id) is not t:   # Удалена, пока обработчик уступал цикл событий
+            not_found.append(t.task_id)
+            continue
+        matched += 1
+        if updates:
+            _apply_changes(t, updates)
+            updated += 1
+        if i >= last_rename and (i + 1) % BULK_CHUNK == 0:
+            await asyncio.sleep(0)
+
+    if bulk.filter is not None:
+        f = bulk.filter
+        # Кандидаты - через индекс по user_id, если он задан, иначе все задачи
+        if f.user_id is not None:
+            candidates = [tasks[i] for i in task_ids_by_user.get(f.user_id, ())]
+        else:
+            candidates = list(_live_tasks())
+        for i, t in enumerate(candidates):
+            if (i + 1) % BULK_CHUNK == 0:
+                await asyncio.sleep(0)
+            # Условие проверяется на момент изменения: после уступки задачу могли удалить или изменить
+            if _live(t.task_id) is not t or (f.user_id is not None and t.user_id != f.user_id):
+                continue
+            if (f.priority is None or t.priority == f.priority) and (f.completed is None or t.completed == f.completed):
+                matched += 1
+                if filter_updates:
+                    _apply_changes(t, filter_updates)
+                    updated += 1
+    return BulkResult(matched=matched, updated=updated, not_found=not_found)
+
+
+@router.get("/changes", response_model=TaskChanges)   # До /{slug}, иначе "changes" будет принят за slug
+async def task_changes_since(since: int = Query(0, ge=0, description="Последняя известная клиенту версия")):
+    """Изменения задач после версии since: вставки, обновления и удаления (tombstone без task)"""
+    changes = task_changes.since(since)
+    if changes is None:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Версия {since} вне журнала изменений (с {task_changes.oldest} по {task_changes.version})"
+                   " - нужен полный GET /task/",
+        )
+    return TaskChanges(
+        version=task_changes.version,
+        changes=[TaskChange(version=v, op=op, task_id=task_id, task=item) for v, op, task_id, item in changes],
+    )
+
+
+STREAM_HEARTBEAT = 15  # Секунд между комментариями keepalive, чтобы прокси не закрывали простаивающее соединение
+
+
+STATS_FIELDS = ("user_id", "priority", "completed")   # Порядок совпадает с ключом task_counts
+_stats_cache: dict[tuple[str, ...], tuple[int, TaskStats]] = {}
+
+
+@router.get("/stats", response_model=TaskStats)   # До /{slug}
+async def task_stats(group_by: str = Query("", description="Поля группировки через запятую: user_id,priority,completed")):
+    """Количество задач с группировкой - из счётчиков, которые ведутся при каждом изменении, без прохода по задачам.
+
+    Стоимость - O(число групп); повторный запрос без изменений задач берётся из кэша за O(1).
+    """
+    requested = {g.strip() for g in group_by.split(",") if g.strip()}
+    unknown = requested - set(STATS_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by fields: {', '.join(sorted(unknown))}")
+    fields = tuple(f for f in STATS_FIELDS if f in requested)
+    cached = _stats_cache.get(fields)
+    if cached is not None and cached[0] == task_changes.version:
+        return cached[1]
+    positions = [STATS_FIELDS.index(f) for f in fields]
+    groups: Counter[tuple] = Counter()
+    for key, count in task_counts.items():
+        groups[tuple(key[i] for i in positions)] += count
+    stats = TaskStats(
+        total=len(tasks) - len(tombstones),
+        groups=[{**dict(zip(fields, key)), "count": count} for key, count in sorted(groups.items())] if fields else [],
+    )
+    _stats_cache[fields] = (task_changes.version, stats)
+    return stats
+
+
+@router.get("/stream")  # До /{slug}
+async def task_stream(user_id: int | None = Query(None, description="Только задачи этого пользователя")):
+    """Живой поток изменений задач (Server-Sent Events): event - insert/update/delete, data - как в /changes
+
+    Если клиент не успевал читать и часть событий была выброшена, приходит event: overflow с версией,
+    начиная с которой нужно догнать изменения через GET /task/changes?since=.
+    """
+    subscription = task_events.subscribe(user_id)
+
+    async def events():
+        since = task_changes.version    # Последняя версия, о которой клиент уже знает
+        try:
+            while True:
+                batch = await subscription.get(timeout=STREAM_HEARTBEAT)
+                if not batch:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped:
+                    subscription.dropped = False
+                    yield f"event: overflow\ndata: {{\"since\": {since}}}\n\n"
+                for version, frame in batch:
+                    since = version
+                    yield frame
+        finally:
+            task_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{slug}", response_model=Task)
-async def task_by_id(slug: str):
-    for t in tasks:
-        if t.slug == slug:
-            return t
-    raise HTTPException(status_code=404, detail="Задача не найдена")
+async def task_by_id(slug: str, response: Response, fields: str | None = FIELDS_QUERY):
+    selected = projection.parse_fields(Task, fields)
+    task_id = task_ids_by_slug.get(slug)
+    if task_id is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    t = tasks[task_id]
+    if selected:
+        response = Response(projection.dump_json(Task, selected, t, many=False), media_type="application/json")
+        etags.tag(response, t.version)
+        return response
+    etags.tag(response, t.version)
+    return t
 
 
-@router.post("/create", response_model=Task)    # FastAPI ждет, что функция вернёт объект типа response_model=Task
-async def create_task(task: CreateTask):
-    if any(task.title == t.title for t in tasks):
+@router.post("/batch-get", response_model=TaskBatch)
+async def tasks_batch_get(batch: BatchGet):
+    """Много задач за один запрос вместо GET /{slug} на каждую - по индексам, O(k) для k ключей"""
+    found = [_live(task_id) for task_id in batch.ids]
+    found += [_live(task_ids_by_slug.get(slug)) for slug in batch.slugs]
+    keys = batch.ids + batch.slugs
+    return TaskBatch(items=found, not_found=[key for key, t in zip(keys, found) if t is None])
+
+
+def _create(task: CreateTask) -> Task:
+    if task.title in task_ids_by_title:
         raise HTTPException(status_code=400, detail="Task already exists")
-    if any(task.slug == t.slug for t in tasks):
+    if task.slug in task_ids_by_slug:
         raise HTTPException(status_code=400, detail="Slug already exists")
-    new_id = max((t.task_id for t in tasks), default=0) + 1
+    new_id = next(reversed(tasks), 0) + 1   # Ключи идут по возрастанию - последний ключ и есть максимальный
     new_task = Task(
         task_id=new_id,
         title=task.title,
@@ -58,57 +499,144 @@ async def create_task(task: CreateTask):
         slug=task.slug,
         user_id=task.user_id
     )
-    tasks.append(new_task)
+    _add(new_task)
     return new_task
 
 
+IDEMPOTENCY_HEADER = Header(None, description="Повтор с тем же ключом вернёт первый ответ, не создавая задачу снова")
+
+
+@router.post("/create", response_model=Task)    # FastAPI ждет, что функция вернёт объект типа response_model=Task
+async def create_task(task: CreateTask, idempotency_key: str | None = IDEMPOTENCY_HEADER):
+    return idempotency.run("task-create", idempotency_key, task, lambda: _create(task))
+
+
+IMPORT_CHUNK = 1000     # После каждой порции импорт уступает цикл событий другим запросам
+_TASK_ROWS = TypeAdapter(list[dict])   # Экспорт сериализует копии строк, а не сами объекты Task
+
+
+def _copy_row(t: Task) -> dict:
+    return t.__dict__.copy()    # Значения полей - неизменяемые str / int / bool, глубокая копия не нужна
+
+
+@router.post("/import", status_code=202, response_model=JobInfo)
+async def import_tasks(items: list[CreateTask]):
+    """Фоновый импорт: сразу возвращает задание, статус - /jobs/{job_id}"""
+    async def run(job: jobs.Job):
+        created = 0
+        errors = []
+        for i, item in enumerate(items):
+            try:
+                _create(item)
+                created += 1
+            except HTTPException as e:
+                errors.append({"index": i, "detail": e.detail})
+            if (i + 1) % IMPORT_CHUNK == 0:
+                job.advance(IMPORT_CHUNK)
+                await asyncio.sleep(0)
+        job.done = len(items)
+        return ImportResult(created=created, errors=errors).model_dump()
+
+    return jobs.submit("task-import", run, total=len(items))
+
+
+@router.post("/export", status_code=202, response_model=JobInfo)
+async def export_tasks():
+    """Фоновый экспорт всех задач в JSON, результат - /jobs/{job_id}/result"""
+    async def run(job: jobs.Job):
+        # PATCH меняет объекты Task на месте, а сериализация идёт в потоке - поэтому по порциям копируются поля
+        # (копия __dict__ на порядок дешевле model_dump), а вся работа pydantic - в потоке. Каждая строка
+        # согласована, но порции копируются в разные моменты: экспорт - не снимок всей таблицы на одну версию
+        items = list(_live_tasks())
+        job.total = len(items)
+        return await jobs.dump_json_chunks(_TASK_ROWS, items, job, copy=_copy_row)
+
+    return jobs.submit("task-export", run)
+
+
+# Между проверкой If-Match и _apply_changes нет await - в одном цикле событий это атомарный compare-and-set
+
 @router.put("/{task_id}", response_model=Task)
-async def update_task(task_id: int, task: UpdateTask):
-    for t in tasks:
-        if t.task_id == task_id:
-            t.title = task.title
-            t.content = task.content
-            t.priority = task.priority
-            t.completed = task.completed
-            t.slug = task.slug
-            t.user_id = task.user_id
-            return t
-    raise HTTPException(status_code=404, detail="Задача не найдена")
+async def update_task(task_id: int, task: ReplaceTask, response: Response,
+                      if_match: str | None = etags.IF_MATCH_HEADER):
+    """Полная замена задачи (ReplaceTask - все поля); раньше UpdateTask с priority=0 / completed=False по умолчанию"""
+    t = _get_task(task_id)
+    etags.check(if_match, t.version)
+    updates = task.model_dump()
+    _check_unique(t, updates)
+    _apply_changes(t, updates)
+    etags.tag(response, t.version)
+    return t
 
 
 @router.patch("/{task_id}", response_model=Task)
-async def update_task_patch(task_id: int, task: UpdateTask):
-    task_to_update = next((t for t in tasks if t.task_id == task_id), None) # Что делает:
-    # Перебирает список tasks (где t — объекты задач).
-    # Находит первый объект, у которого t.task_id == task_id.
-    # Если не находит, возвращает None.
+async def update_task_patch(task_id: int, task: UpdateTask, response: Response,
+                            if_match: str | None = etags.IF_MATCH_HEADER):
+    task_to_update = _live(task_id)  # Поиск по ключу словаря - O(1), без перебора всех задач
     if not task_to_update:
         raise HTTPException(status_code=404, detail="Task not found")
+    etags.check(if_match, task_to_update.version)
     updates = task.model_dump(exclude_unset=True, exclude_none=True)    # Что делает:
     # task — это Pydantic-модель UpdateTask, переданная в запросе.
     # .model_dump() конвертирует её в словарь.
     # exclude_unset=True — исключает поля, которые не были переданы в запросе.
     # exclude_none=True — исключает поля со значением None.
-    for field, value in updates.items():
-        setattr(task_to_update, field, value)  # Обновляем поля модели
-        # Что делает:
-        # updates.items() возвращает пары (ключ, значение) из словаря.
-        # setattr(obj, field, value) — это встроенная функция Python, которая:
-        # Берёт объект task_to_update.
-        # Находит его атрибут с именем field (например, title).
-        # Присваивает ему value (например, "New title").
+    _check_unique(task_to_update, updates)
+    _apply_changes(task_to_update, updates)  # setattr(task_to_update, field, value) для каждого поля + индексы
+    etags.tag(response, task_to_update.version)
     return task_to_update
 
 
+@router.delete("/bulk", response_model=BulkDeleteResult)    # До /{task_id}
+async def delete_tasks_bulk(bulk: BulkDeleteTasks):
+    """Удаление по списку id и/или фильтру за один проход - O(k) по индексам, если задан user_ids"""
+    deleted = 0
+    not_found = []
+    for task_id in bulk.task_ids:
+        t = _live(task_id)
+        if t is None:
+            not_found.append(task_id)
+        else:
+            _remove(t)
+            deleted += 1
+
+    if bulk.user_ids or bulk.completed is not None:
+        if bulk.user_ids:
+            user_ids = dict.fromkeys(bulk.user_ids)  # Без повторов, иначе задача удалялась бы дважды
+            candidates = [tasks[i] for user_id in user_ids for i in task_ids_by_user.get(user_id, ())]
+        else:
+            candidates = list(_live_tasks())
+        for t in candidates:
+            if bulk.completed is None or t.completed == bulk.completed:
+                _remove(t)
+                deleted += 1
+    return BulkDeleteResult(deleted=deleted, not_found=not_found)
+
+
 @router.delete("/{task_id}", response_model=dict)
 async def delete_task(task_id: int):
-    for i, t in enumerate(tasks):
-        if t.task_id == task_id:
-            del tasks[i]    # .remove(элемент) не подходит - надо указать элемент списка, не индекс
-            # del_task = tasks.pop(i)
-            return {'Message': f'Task {task_id} {t.title} удален'}
-            # return {'Deleted Task': del_task}
-    raise HTTPException(status_code=404, detail="Задача не найдена")
+    t = _get_task(task_id)
+    _remove(t)  # del tasks[task_id] - удаление из словаря по ключу, без сдвига элементов как у списка
+    return {'Message': f'Task {task_id} {t.title} удален'}
+
+
+@router.post("/{task_id}/restore", response_model=Task)
+async def restore_task(task_id: int, response: Response):
+    """Отмена мягкого удаления - пока компактор не убрал задачу окончательно"""
+    if task_id not in tombstones:
+        raise HTTPException(status_code=404, detail="Удалённая задача не найдена")
+    t = tasks[task_id]
+    # Пока задача была удалена, её title или slug могла занять новая задача
+    if t.title in task_ids_by_title:
+        raise HTTPException(status_code=400, detail="Task already exists")
+    if t.slug in task_ids_by_slug:
+        raise HTTPException(status_code=400, detail="Slug already exists")
+    del tombstones[task_id]
+    _index_lookup(t)    # Записи в отсортированных индексах остались на месте
+    t.version += 1
+    _notify("insert", t.task_id, t.model_dump(), (t.user_id,))
+    etags.tag(response, t.version)
+    return t
 
 # @router.delete("/delete}")
 # def delete_task(task_id: int):
@@ -0,0 +1,27 @@
+from mtasks.changes import ChangeLog
+
+
+def test_since_returns_latest_change_per_key():
+    log = ChangeLog()
+    log.record("insert", 1, {"title": "a"})
+    log.record("insert", 2, {"title": "b"})
+    log.record("update", 1, {"title": "c"})
+    assert log.since(1) == [(2, "insert", 2, {"title": "b"}), (3, "update", 1, {"title": "c"})]
+    assert log.since(3) == []
+
+
+def test_since_older_than_log_needs_resync():
+    log = ChangeLog(max_changes=2)
+    for key in range(5):
+        log.record("insert", key)
+    assert log.since(2) is None
+    assert log.since(3) == [(4, "insert", 3, None), (5, "insert", 4, None)]
+
+
+def test_since_newer_than_log_needs_resync():
+    # Клиент помнит версию 500, а журнал после перезапуска начался заново
+    log = ChangeLog()
+    assert log.since(500) is None
+    log.record("insert", 1)
+    assert log.since(1) == []
+    assert log.since(2) is None
@@ -6,8 +6,18 @@
     put '/update' с функцией update_user.
     delete '/delete' с функцией delete_user.
 """
-from fastapi import APIRouter, HTTPException
-from mtasks.schemas import User, CreateUser, UpdateUser
+import asyncio
+import threading
+from functools import partial
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from mtasks.schemas import (User, CreateUser, UpdateUser, ReplaceUser, BulkDeleteUsers, BulkDeleteResult, JobInfo,
+                            ImportResult, BatchGet, UserBatch)
+from mtasks import etags, idempotency, projection, serialization, singleflight
+from mtasks.search import PrefixIndex
+from mtasks.routers import jobs
 
 # from mtasks.models import User_sql  # SQLAlchemy in addition
 # Роутеры должны зависеть от схем (Pydantic), а не от моделей SQLAlchemy
@@ -25,12 +35,120 @@ router = APIRouter(
 # Это более гибкий подход, но он не даёт подсказок о том, какие данные должны храниться в списке.
 # users: list[User] = [] - будет предупреждение, так как здесь users это список объектов
 
-users = []  # Список пользователей (храним словари)
+# Хранилище - словарь user_id -> словарь пользователя (порядок добавления сохраняется) и индексы username и slug.
+# Поиск, проверка уникальности и удаление - O(1) вместо прохода по списку и его перезаписи.
+users: dict[int, dict] = {}
+user_ids_by_username: dict[str, int] = {}
+user_ids_by_slug: dict[str, int] = {}
+# Отсортированные индексы для GET /user/search - поиск по началу username и slug
+usernames_sorted = PrefixIndex()
+slugs_sorted = PrefixIndex()
+# Синхронные маршруты выполняются в пуле потоков: любое изменение хранилища (словарь, три индекса, выдача id)
+# и проверка If-Match вместе с изменением записи - только под этой блокировкой
+_write_lock = threading.Lock()
+
+
+def _add_user(u: dict):
+    users[u['user_id']] = u
+    user_ids_by_username[u['username']] = u['user_id']
+    user_ids_by_slug[u['slug']] = u['user_id']
+    usernames_sorted.add(u['username'], u['user_id'])
+    slugs_sorted.add(u['slug'], u['user_id'])
+
+
+def _remove_user(u: dict):
+    del users[u['user_id']]
+    del user_ids_by_username[u['username']]
+    del user_ids_by_slug[u['slug']]
+    usernames_sorted.remove(u['username'], u['user_id'])
+    slugs_sorted.remove(u['slug'], u['user_id'])
+
+
+def _find_user(username: str) -> dict | None:
+    user_id = user_ids_by_username.get(username)
+    return users[user_id] if user_id is not None else None
+
+
+def _set_slug(u: dict, slug: str):
+    """Меняет slug пользователя вместе с индексом; занятый другим пользователем slug - ошибка 400"""
+    if user_ids_by_slug.get(slug, u['user_id']) != u['user_id']:
+        raise HTTPException(status_code=400, detail="Slug already exists")
+    del user_ids_by_slug[u['slug']]
+    slugs_sorted.remove(u['slug'], u['user_id'])
+    u['slug'] = slug
+    user_ids_by_slug[slug] = u['user_id']
+    slugs_sorted.add(slug, u['user_id'])
+
+
+def _update_user(u: dict, updates: dict):
+    if 'slug' in updates:   # Сначала slug - если он занят, словарь не будет изменён частично
+        _set_slug(u, updates['slug'])
+    u.update(updates)
+    u['version'] += 1     # Любое изменение - новая версия (ETag), старый If-Match после этого получит 412
+
+
+_USER = TypeAdapter(User)   # Схема валидации строится один раз, а не на каждый запрос
+# Проверка одного поля по типу и ограничениям из User - для PATCH, где меняются одно-два поля, а не вся запись
+_USER_FIELDS = {
+    name: TypeAdapter(Annotated[info.annotation, *info.metadata] if info.metadata else info.annotation)
+    for name, info in User.model_fields.items()
+}
+_USER_FIELD_NAMES = tuple(User.model_fields)
+
+
+def _construct_user(u: dict) -> User:
+    """
+    User.model_construct для полной записи из хранилища: все поля есть и уже проверены, поэтому без того, что
+    model_construct делает сверх этого (поиск alias и значений по умолчанию по каждому полю, ~3 мкс против ~0.7)
+    """
+    m = User.__new__(User)
+    object.__setattr__(m, "__dict__", {name: u[name] for name in _USER_FIELD_NAMES})
+    object.__setattr__(m, "__pydantic_fields_set__", set(_USER_FIELD_NAMES))
+    object.__setattr__(m, "__pydantic_extra__", None)
+    object.__setattr__(m, "__pydantic_private__", None)
+    return m
+
+
+def _patch_user(username: str, user: UpdateUser, response: Response, if_match: str | None = None) -> User:
+    """
+    Общий путь для всех PATCH: в словарь попадают только переданные клиентом поля (model_fields_set - без
+    model_dump и без копии модели), и проверяются только они - закешированным TypeAdapter своего поля.
+    Остальная запись уже проверена при создании, поэтому ответ собирается без повторной валидации
+    (_construct_user, см. bench_validation).
+    """
+    updates = {}
+    for field in user.model_fields_set:
+        value = getattr(user, field)
+        if value is not None:   # Как exclude_none=True
+            updates[field] = _USER_FIELDS[field].validate_python(value)
+    with _write_lock:   # Поиск тоже под блокировкой: иначе параллельный DELETE оставит нас с удалённой записью
+        u = _find_user(username)
+        if u is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        etags.check(if_match, u['version'])
+        _update_user(u, updates)
+        result = _construct_user(u)     # Снимок под блокировкой - без половины чужого изменения
+    etags.tag(response, result.version)
+    return result
+
+
+FIELDS_QUERY = Query(None, description="Поля ответа через запятую, например user_id,username")
 
 
 @router.get("/", response_model=list[User])
-async def get_all_users():
-    return [User(**u) for u in users]  # Преобразование каждого словаря в объект User
+async def get_all_users(fields: str | None = FIELDS_QUERY):
+    selected = projection.parse_fields(User, fields)
+    if len(users) >= serialization.STREAM_THRESHOLD:     # Большой список - порциями в пуле процессов
+        return serialization.stream_json_list(list(users.values()), selected or tuple(User.model_fields), by_key=True)
+    if len(users) >= singleflight.OFFLOAD_THRESHOLD:
+        # Одинаковые одновременные запросы ждут один общий ответ (см. singleflight)
+        dump = partial(projection.dump_json, User, selected or tuple(User.model_fields))
+        rows = lambda: [u.copy() for u in users.values()]     # Копии - словари users меняются на месте
+        body = await singleflight.shared_json(("/user/", selected), rows, dump)
+        return Response(body, media_type="application/json")
+    if selected:    # Только запрошенные поля - без создания полного User для каждого словаря
+        return Response(projection.dump_json(User, selected, list(users.values())), media_type="application/json")
+    return [User(**u) for u in users.values()]  # Преобразование каждого словаря в объект User
     # return users - не правильно, так как response_model=list[User] - список объектов, а не словарей
 
 #   1. Если используете response_model=list[User], функция должна возвращать список объектов User, а не список словарей.
@@ -65,32 +183,81 @@ async def get_all_users():
 # Риск отправить клиенту "мусорные" данные.
 
 
+SEARCH_INDEXES = {"username": usernames_sorted, "slug": slugs_sorted}
+
+
+@router.get("/search", response_model=list[User])     # До /{slug}, иначе "search" попадёт в slug
+def search_users(prefix: str = Query(..., min_length=1, description="Начало username или slug, без учёта регистра"),
+                 field: Literal["username", "slug"] | None = None,
+                 fuzzy: bool = False,
+                 limit: int = Query(20, ge=1, le=1000),
+                 fields: str | None = FIELDS_QUERY):
+    """Пользователи, чей username (или slug) начинается с prefix; fuzzy - допускается одна опечатка в префиксе"""
+    selected = projection.parse_fields(User, fields)
+    indexes = [SEARCH_INDEXES[field]] if field else SEARCH_INDEXES.values()
+    found = {}      # user_id -> None: порядок результатов без повторов (совпасть могут и username, и slug)
+    for index in indexes:
+        ids = index.fuzzy(prefix, limit) if fuzzy else index.prefix(prefix, limit)
+        found.update(dict.fromkeys(ids))
+    # Чтение без блокировки: между поиском в индексе и словарём пользователя мог удалить другой поток - пропускаем
+    items = [u for user_id in list(found)[:limit] if (u := users.get(user_id)) is not None]
+    if selected:
+        return Response(projection.dump_json(User, selected, items), media_type="application/json")
+    return [User(**u) for u in items]
+
+
 @router.get("/{slug}", response_model=User)
-def get_user_by_id(slug: str):
-    for u in users:
-        if u['slug'] == slug:
-            return User(**u)
-            # return u  - не правильно, так как response_model=User - объект
-    raise HTTPException(status_code=404, detail="Пользователь не найден")
+def get_user_by_id(slug: str, response: Response, fields: str | None = FIELDS_QUERY):
+    selected = projection.parse_fields(User, fields)
+    u = users.get(user_ids_by_slug.get(slug))   # Без блокировки: запись могли удалить между двумя поисками
+    if u is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if selected:
+        response = Response(projection.dump_json(User, selected, u, many=False), media_type="application/json")
+        etags.tag(response, u['version'])
+        return response
+    etags.tag(response, u['version'])
+    return User(**u)
+    # return u  - не правильно, так как response_model=User - объект
+
+
+@router.post("/batch-get", response_model=UserBatch)
+def users_batch_get(batch: BatchGet):
+    """Много пользователей за один запрос вместо GET /{slug} на каждого - по индексам, O(k) для k ключей"""
+    found = [users.get(user_id) for user_id in batch.ids]
+    found += [users.get(user_ids_by_slug.get(slug)) for slug in batch.slugs]
+    keys = batch.ids + batch.slugs
+    return UserBatch(items=[None if u is None else _USER.validate_python(u) for u in found],
+                     not_found=[key for key, u in zip(keys, found) if u is None])
+
+
+def _create_user(user: CreateUser) -> dict:
+    with _write_lock:   # Проверки, выдача id и добавление - одним шагом, иначе два потока получат один id
+        if user.username in user_ids_by_username:
+            raise HTTPException(status_code=400, detail="User already exists")
+        if user.slug in user_ids_by_slug:
+            raise HTTPException(status_code=400, detail="Slug already exists")
+        new_id = next(reversed(users), 0) + 1   # Ключи идут по возрастанию - последний ключ и есть максимальный
+        new_user = {
+            "user_id": new_id,
+            "username": user.username,
+            "firstname": user.firstname,
+            "lastname": user.lastname,
+            "age": user.age,
+            "slug": user.slug,
+            "version": 1
+        }
+        _add_user(new_user)
+    return new_user
+
+
+IDEMPOTENCY_HEADER = Header(None, description="Повтор с тем же ключом вернёт первый ответ, не создавая пользователя")
 
 
 @router.post("/create", response_model=User)  # FastAPI ожидает, что функция вернёт объект типа User
-def create_user(user: CreateUser):
-    if any(user.username == u['username'] for u in users):
-        raise HTTPException(status_code=400, detail="User already exists")
-    if any(u["slug"] == user.slug for u in users):
-        raise HTTPException(status_code=400, detail="Slug already exists")
-    new_id = max((u['user_id'] for u in users), default=0) + 1
-    new_user = {
-        "user_id": new_id,
-        "username": user.username,
-        "firstname": user.firstname,
-        "lastname": user.lastname,
-        "age": user.age,
-        "slug": user.slug
-    }
-    users.append(new_user)
-    return User(**new_user)  # Преобразование словаря в объект User
+def create_user(user: CreateUser, idempotency_key: str | None = IDEMPOTENCY_HEADER):
+    # Преобразование словаря в объект User
+    return idempotency.run("user-create", idempotency_key, user, lambda: User(**_create_user(user)))
 # В этом варианте мы возвращаем словарь, но преобразуем его в объект User с помощью User(**new_user)
 # return new_user - это не правильно, так как response_model=User - объект, а не словарь
 
@@ -107,28 +274,62 @@ def create_user(user: CreateUser):
 #     )
 
 
+IMPORT_CHUNK = 1000     # После каждой порции импорт уступает цикл событий другим запросам
+_USER_LIST = TypeAdapter(list[User])
+
+
+@router.post("/import", status_code=202, response_model=JobInfo)
+async def import_users(items: list[CreateUser]):
+    """Фоновый импорт: сразу возвращает задание, статус - /jobs/{job_id}"""
+    async def run(job: jobs.Job):
+        created = 0
+        errors = []
+        for i, item in enumerate(items):
+            try:
+                _create_user(item)
+                created += 1
+            except HTTPException as e:
+                errors.append({"index": i, "detail": e.detail})
+            if (i + 1) % IMPORT_CHUNK == 0:
+                job.advance(IMPORT_CHUNK)
+                await asyncio.sleep(0)
+        job.done = len(items)
+        return ImportResult(created=created, errors=errors).model_dump()
+
+    return jobs.submit("user-import", run, total=len(items))
+
+
+@router.post("/export", status_code=202, response_model=JobInfo)
+async def export_users():
+    """Фоновый экспорт всех пользователей в JSON, результат - /jobs/{job_id}/result"""
+    async def run(job: jobs.Job):
+        snapshot = [User(**u) for u in users.values()]
+        job.total = len(snapshot)
+        return await jobs.dump_json_chunks(_USER_LIST, snapshot, job)
+
+    return jobs.submit("user-export", run)
+
+
 """ НИЖЕ PUT и PATCH работают одинаково (как частичное обновление), но это антипаттерн.
 Исправьте PUT для полной замены ресурса либо удалите его, оставив только PATCH.
-URL (/{username}) у вас теперь правильный для обоих методов. """
+URL (/{username}) у вас теперь правильный для обоих методов.
+Исправлено: PUT принимает ReplaceUser (все поля обязательны) и заменяет запись целиком, PATCH - частичное обновление. """
 
 @router.put("/{username}", response_model=User)     # изменил update на {username}, см. ниже
-def update_user(username: str, user: UpdateUser):  # сделал изменение на username, а не user_id
-    for u in users:
-        if u['username'] == username:
-            if user.firstname is not None:  # проверяю, что поле firstname в объекте UpdateUser не равно None.
-                # Это важно, потому что Pydantic-модель UpdateUser может содержать None
-                # для необязательных полей (если они помечены как Optional)
-                u['firstname'] = user.firstname # Если поле передано (не None), вы обновляете соответствующий ключ
-                # в словаре u. Это стандартный подход для частичного обновления данных.
-            if user.lastname is not None:
-                u['lastname'] = user.lastname
-            if user.age is not None:
-                u['age'] = user.age
-            if user.slug is not None:
-                u["slug"] = user.slug
-            return User(**u)
-            # return u  - не правильно, так как response_model=User - объект
-    raise HTTPException(status_code=404, detail="Product not found")
+def update_user(username: str, user: ReplaceUser, response: Response,
+                if_match: str | None = etags.IF_MATCH_HEADER):  # сделал изменение на username, а не user_id
+    # Раньше: if user.firstname is not None: u['firstname'] = user.firstname - и так по каждому полю,
+    # то есть частичное обновление. ReplaceUser не допускает пропусков - заменяются все поля
+    with _write_lock:
+        u = _find_user(username)
+        if u is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etags.check(if_match, u['version'])
+        _update_user(u, user.model_dump())     # slug первым - он может быть занят, тогда ничего не меняем
+        result = _construct_user(u)     # Как в _patch_user: снимок под блокировкой, поля уже проверил ReplaceUser
+    etags.tag(response, result.version)
+    return result
+    # return u  - не правильно, так как response_model=User - объект
 
 # Поведение PUT с Optional-полями
 # Если в модели Pydantic поля помечены как Optional, и клиент отправляет не все поля в PUT-запросе, то:
@@ -142,14 +343,11 @@ def update_user(username: str, user: UpdateUser):  # сделал изменен
 # model_dump() — метод Pydantic v2 (актуально для Python 3.10+).
 # Постепенное обновление полей через цикл
 @router.patch("/one/{username}", response_model=User)
-def update_user_patch_one(username: str, user: UpdateUser):
-    user_data = next((u for u in users if u['username'] == username), None)
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    updates = user.model_dump(exclude_unset=True, exclude_none=True)  # Pydantic v2
-    for field, value in updates.items():
-        user_data[field] = value        # user_data.update(updates) - иной вариант
-    return User(**user_data)
+def update_user_patch_one(username: str, user: UpdateUser, response: Response,
+                          if_match: str | None = etags.IF_MATCH_HEADER):
+    # Было: updates = user.model_dump(exclude_unset=True, exclude_none=True), цикл user_data[field] = value
+    # и User(**user_data) - повторная валидация всей записи. Теперь все варианты PATCH идут через _patch_user
+    return _patch_user(username, user, response, if_match)
 
 # Почему exclude_defaults не сработал?
 # exclude_defaults исключает только поля, которые равны default-значениям модели.
@@ -161,8 +359,11 @@ def update_user_patch_one(username: str, user: UpdateUser):
 
 #   Вариант 1 (С next() + model_dump) улучшенный:
 @router.patch("/two/{username}", response_model=User)
-def update_user_patch_two(username: str, user: UpdateUser):
-    user_data = next((u for u in users if u['username'] == username), None) # Ссылка на словарь user из списка users (если найден).
+def update_user_patch_two(username: str, user: UpdateUser, response: Response,
+                          if_match: str | None = etags.IF_MATCH_HEADER):
+    return _patch_user(username, user, response, if_match)
+    # user_data = _find_user(username) - ссылка на словарь user из users (если найден) - по индексу username
+    # Раньше: next((u for u in users if u['username'] == username), None) - перебор всего списка
 # def next(*args, **kwargs) - **kwargs это default, можно записать
 # (u for u in users if u['username'] == username) - это генераторное выражение, которое создаёт итератор
 # next() пытается получить первый элемент из этого итератора, если совпадение не найдено (итератор пуст), возврат None
@@ -178,9 +379,7 @@ def update_user_patch_two(username: str, user: UpdateUser):
     #     if condition(x):
     #         first_match = x
     #         break
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    user_data.update(user.model_dump(exclude_unset=True, exclude_none=True))   # user - объект Pydantic модели UpdateUser, содержит новые данные
+    # _update_user(user_data, user.model_dump(exclude_unset=True, exclude_none=True)) - user - объект Pydantic модели UpdateUser, содержит новые данные
     # user.model_dump(exclude_unset=True): - преобразует модель в словарь
     # exclude_unset=True означает, что в словарь попадут только те поля, которые были явно заданы в запросе
     # user_data.update() обновляет исходный словарь пользователя новыми значениями
@@ -191,7 +390,6 @@ def update_user_patch_two(username: str, user: UpdateUser):
     # user = User(name="Alice", age=25)
     # user_dict = user.model_dump()
     # # Результат: {'name': 'Alice', 'age': 25}
-    return User(**user_data)
 
 # Для PATCH клиент передаёт только изменяемые поля, а сервер обновляет только их.
 # В модели Pydantic все поля должны быть Optional, но в роутинге указываются все возможные поля, которые можно изменить
@@ -203,30 +401,19 @@ def update_user_patch_two(username: str, user: UpdateUser):
 
 
 @router.patch("/three/{username}", response_model=User)
-def update_user_patch_three(username: str, user: UpdateUser):
-    for u in users:
-        if u['username'] == username:
-            updates = user.dict(exclude_unset=True, exclude_none=True)  # Только переданные поля
-            u.update(updates)
-            return User(**u)
-    raise HTTPException(status_code=404, detail="User not found")
+def update_user_patch_three(username: str, user: UpdateUser, response: Response,
+                            if_match: str | None = etags.IF_MATCH_HEADER):
+    # Было: user.dict(exclude_unset=True, exclude_none=True) - устаревший в Pydantic v2 метод
+    return _patch_user(username, user, response, if_match)
 
 
 # Вариант 3 (Ручные проверки is not None):
 @router.patch("/plus/{username}", response_model=User)
-async def update_user_patch_plus(username: str, user: UpdateUser):
-    for u in users:
-        if u['username'] == username:
-            if user.firstname is not None:
-                u['firstname'] = user.firstname
-            if user.lastname is not None:
-                u['lastname'] = user.lastname
-            if user.age is not None:
-                u['age'] = user.age
-            if user.slug is not None:
-                u["slug"] = user.slug
-            return User(**u)
-    raise HTTPException(status_code=404, detail="Задача не найдена")
+def update_user_patch_plus(username: str, user: UpdateUser, response: Response,
+                           if_match: str | None = etags.IF_MATCH_HEADER):
+    # Ручные проверки "if user.firstname is not None: u['firstname'] = ..." по каждому полю - то же самое,
+    # что цикл по model_fields_set в _patch_user
+    return _patch_user(username, user, response, if_match)
 
 #   Что правильно: PUT /update и PATCH /{username} или PUT /{username} и PATCH /{username}
 # Правильнее выбирать PUT /{username} и PATCH /{username} (унифицированные пути). Вот почему:
@@ -246,13 +433,36 @@ async def update_user_patch_plus(username: str, user: UpdateUser):
 
 @router.delete("/delete", response_model=dict)
 def delete_user(username: str):
-    global users
-    for u in users:
-        if u['username'] == username:
-            users = [u for u in users if u['username'] != username] # перезапись списка словарей без удаленного словаря
+    with _write_lock:
+        u = _find_user(username)
+        if u is not None:
+            _remove_user(u)     # Раньше: users = [u for u in users if ...] - перезапись всего списка на каждое удаление
             return {"message": f"User: {username} deleted"}
     raise HTTPException(status_code=404, detail="User not found")
 
+
+@router.delete("/bulk", response_model=BulkDeleteResult)
+def delete_users_bulk(bulk: BulkDeleteUsers):
+    """Удаление многих пользователей за один проход - O(k) по индексам, k - число id/username в запросе"""
+    deleted = 0
+    not_found = []
+    with _write_lock:
+        for user_id in bulk.user_ids:
+            u = users.get(user_id)
+            if u is None:
+                not_found.append(user_id)
+            else:
+                _remove_user(u)
+                deleted += 1
+        for username in bulk.usernames:
+            u = _find_user(username)
+            if u is None:
+                not_found.append(username)
+            else:
+                _remove_user(u)
+                deleted += 1
+    return BulkDeleteResult(deleted=deleted, not_found=not_found)
+
 """
     Почему работает username: str без Query?
 @router.delete("/delete", response_model=dict)
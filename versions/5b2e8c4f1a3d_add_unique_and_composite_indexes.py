@@ -0,0 +1,32 @@
+"""add unique and composite indexes
+
+Revision ID: 5b2e8c4f1a3d
+Revises: 846cf4789ef8
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e8c4f1a3d'
+down_revision: Union[str, None] = '846cf4789ef8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ix_users_slug и ix_tasks_slug (unique) уже созданы начальной миграцией
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_tasks_title', 'tasks', ['title'], unique=True)
+    # Фильтры списка задач: user_id -> completed -> priority (префикс индекса тоже используется)
+    op.create_index('ix_tasks_user_id_completed_priority', 'tasks', ['user_id', 'completed', 'priority'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_user_id_completed_priority', table_name='tasks')
+    op.drop_index('ix_tasks_title', table_name='tasks')
+    op.drop_index('ix_users_username', table_name='users')
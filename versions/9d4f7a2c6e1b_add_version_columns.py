@@ -0,0 +1,34 @@
+"""add version columns for optimistic locking
+
+Revision ID: 9d4f7a2c6e1b
+Revises: 5b2e8c4f1a3d
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4f7a2c6e1b'
+down_revision: Union[str, None] = '5b2e8c4f1a3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ADD COLUMN с постоянным DEFAULT в SQLite меняет только схему, без перезаписи строк - существующие записи
+    # сразу читаются с version = 1, backfill из migration_utils здесь не нужен.
+    # op.add_column, а не batch_alter_table: batch пересоздал бы таблицу целиком
+    op.add_column('users', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('tasks', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    # DROP COLUMN в SQLite - пересоздание таблицы, поэтому batch
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,150 @@
+"""
+Объединение (coalescing) мелких записей в одну транзакцию SQLite.
+
+SQLite допускает только одного писателя, и каждый commit - это fsync файла БД. Если каждый PATCH
+(выполнить задачу, сменить приоритет) делает отдельный commit, пропускная способность упирается в fsync.
+WriteCoalescer собирает записи, пришедшие в течение нескольких миллисекунд, и выполняет их одной транзакцией.
+
+Запись - это функция fn(session), которая что-то меняет через сессию и возвращает результат:
+
+    def complete(session):
+        session.execute(update(Task_sql).where(Task_sql.task_id == 1).values(completed=True))
+
+    await submit_write(complete)
+
+fn должна только работать с БД через сессию - без отправки писем, записи в файлы, изменения хранилищ в памяти и т.п.
+Если пачка падает, её транзакция откатывается и каждая fn выполняется ещё раз, отдельно: изменения в БД при этом
+не дублируются, а любые другие действия fn произошли бы дважды. Такие действия - после await submit_write(fn).
+
+Режим выключен по умолчанию (WRITE_COALESCING = False) - тогда каждая запись идёт своей транзакцией.
+"""
+
+import asyncio
+
+WRITE_COALESCING = False    # Включить объединение записей
+WINDOW_MS = 5               # Сколько миллисекунд собирать пачку записей
+MAX_BATCH = 500             # Максимум записей в одной транзакции
+
+
+class WriteCoalescer:
+    def __init__(self, session_factory, window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает воркер: пачка, которая уже выполняется, завершается, остальные записи получают ошибку"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        queue, self._queue = self._queue, None
+        while queue is not None and not queue.empty():
+            _, future = queue.get_nowait()
+            self._fail(future)
+
+    @staticmethod
+    def _fail(future: asyncio.Future):
+        if not future.done():
+            future.set_exception(RuntimeError("Write coalescer stopped, write was not applied"))
+
+    async def submit(self, fn):
+        """Ставит запись в очередь и ждёт, пока транзакция с ней будет зафиксирована"""
+        if self._queue is None:
+            raise RuntimeError("Write coalescer is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((fn, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            try:
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:     # stop() во время сбора пачки - она ещё не выполнялась
+                for _, future in batch:
+                    self._fail(future)
+                raise
+            flush = asyncio.ensure_future(asyncio.to_thread(self._flush, [fn for fn, _ in batch]))
+            try:
+                results = await asyncio.shield(flush)
+            except asyncio.CancelledError:
+                # Поток отменить нельзя - дожидаемся транзакции и отдаём её результат, а не оставляем ожидающих
+                self._deliver(batch, await flush)
+                raise
+            self._deliver(batch, results)
+
+    @staticmethod
+    def _deliver(batch, results):
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():   # Клиент мог отменить запрос
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _flush(self, fns):
+        """Выполняет пачку одной транзакцией; при ошибке - каждую запись отдельно (fn выполнится второй раз)"""
+        try:
+            with self.session_factory.begin() as session:
+                return [(True, fn(session)) for fn in fns]
+        except Exception:
+            # Одна неудачная запись не должна откатывать чужие - повторяем поштучно
+            return [self._apply_one(fn) for fn in fns]
+
+    def _apply_one(self, fn):
+        try:
+            with self.session_factory.begin() as session:
+                return True, fn(session)
+        except Exception as e:
+            return False, e
+
+
+coalescer: WriteCoalescer | None = None  # Создаётся в lifespan приложения, если WRITE_COALESCING = True
+
+
+async def start():
+    global coalescer
+    if WRITE_COALESCING:
+        from mtasks.backend.db import WriteSessionLocal
+        coalescer = WriteCoalescer(WriteSessionLocal)
+        await coalescer.start()
+
+
+async def stop():
+    global coalescer
+    if coalescer is not None:
+        await coalescer.stop()
+        coalescer = None
+
+
+async def submit_write(fn):
+    """Выполняет запись fn(session): через общую транзакцию, если режим включен, иначе - отдельной транзакцией"""
+    if coalescer is not None:
+        return await coalescer.submit(fn)
+    from mtasks.backend.db import WriteSessionLocal
+
+    def run():
+        with WriteSessionLocal.begin() as session:
+            return fn(session)
+
+    return await asyncio.to_thread(run)